@@ -0,0 +1,29 @@
+"""
+Pointer to the Chroma collection Retriever serves from. ingest.py builds a
+new versioned collection next to the live one and only then replaces this
+file, so readers see either the old or the new collection, never a
+half-built one.
+"""
+import json
+import os
+
+DEFAULT_COLLECTION = "umich_fa2024"
+POINTER_FILE = "active_collection.json"
+
+
+def read_active_collection(persist_directory: str = "./chroma_db", default: str = DEFAULT_COLLECTION) -> str:
+    path = os.path.join(persist_directory, POINTER_FILE)
+    if not os.path.exists(path):
+        return default
+    with open(path, "r") as f:
+        return json.load(f)["collection"]
+
+
+def write_active_collection(name: str, persist_directory: str = "./chroma_db"):
+    path = os.path.join(persist_directory, POINTER_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"collection": name}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
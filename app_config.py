@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+import streamlit as st
+import toml
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+logger = logging.getLogger(__name__)
+
+SECRETS_PATH = ".streamlit/secrets.toml"
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+class AppConfig:
+    """
+    Parsed view of secrets.toml: the allowed-user set and per-user sheet
+    routing, built once per load instead of on every event.
+
+    Routing defaults to the mike_* sheet; individual users can be pointed
+    elsewhere with [google_sheets.routing."user@example.com"] tables holding
+    spreadsheet_id and sheet_name.
+    """
+
+    def __init__(self, secrets: dict):
+        self.secrets = secrets
+        auth = secrets.get("auth", {})
+        self.allowed_users = frozenset(
+            normalize_email(u) for u in auth.get("allowed_users", "").split(",") if u.strip()
+        )
+
+        sheets = secrets.get("google_sheets", {})
+        self.default_sheet = None
+        if "mike_spreadsheet_id" in sheets:
+            self.default_sheet = {
+                "spreadsheet_id": sheets["mike_spreadsheet_id"],
+                "sheet_name": sheets["mike_sheet_name"],
+            }
+        self.sheet_routing = {
+            normalize_email(email): {"spreadsheet_id": route["spreadsheet_id"], "sheet_name": route["sheet_name"]}
+            for email, route in sheets.get("routing", {}).items()
+        }
+
+    def is_allowed(self, email: str) -> bool:
+        return normalize_email(email) in self.allowed_users
+
+    def sheet_for(self, email: str) -> Optional[dict]:
+        return self.sheet_routing.get(normalize_email(email), self.default_sheet)
+
+
+def _load(path: str) -> AppConfig:
+    if os.path.exists(path):
+        return AppConfig(toml.load(path))
+    # e.g. Streamlit Community Cloud, where secrets are not in the project dir
+    return AppConfig(st.secrets.to_dict())
+
+
+class _SecretsWatcher(FileSystemEventHandler):
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+
+    def on_any_event(self, event):
+        paths = {os.path.abspath(event.src_path), os.path.abspath(getattr(event, "dest_path", "") or event.src_path)}
+        if self.path in paths and event.event_type in ("created", "modified", "moved"):
+            reload_config(self.path)
+
+
+_config = None
+_config_lock = threading.Lock()
+_init_lock = threading.Lock()
+_observer = None
+
+
+def reload_config(path: str = SECRETS_PATH) -> AppConfig:
+    global _config
+    try:
+        config = _load(path)
+    except Exception as e:
+        logger.error(f"Failed to reload {path}, keeping previous config: {e}")
+        return _config
+    with _config_lock:
+        _config = config
+    logger.info(f"Loaded config from {path} ({len(config.allowed_users)} allowed users)")
+    return config
+
+
+def get_config(path: str = SECRETS_PATH) -> AppConfig:
+    """
+    Process-wide AppConfig. Loaded on first use and reloaded when the
+    secrets file changes on disk.
+    """
+    global _config, _observer
+    if _config is None:
+        with _init_lock:
+            if _config is None:
+                _config = _load(path)
+                directory = os.path.dirname(os.path.abspath(path))
+                if os.path.isdir(directory):
+                    _observer = Observer()
+                    _observer.schedule(_SecretsWatcher(path), directory, recursive=False)
+                    _observer.daemon = True
+                    _observer.start()
+    return _config
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Process-wide event loop running on a daemon thread. Every Streamlit
+    session runs achat_stream here, so its network calls (Voyage query
+    embedding, OpenAI rewrite and generation) are awaited on one loop instead
+    of each holding a worker thread. Local CPU work in the chain (Chroma and
+    BM25 search, reranking, context packing, history I/O) still runs in the
+    loop's default executor.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="chat-event-loop", daemon=True).start()
+    return _loop
+
+
+def iterate_in_loop(agen: AsyncIterator[T]) -> Iterator[T]:
+    """
+    Drive an async generator on the shared loop and yield its items to a
+    synchronous consumer such as st.write_stream. The consumer's thread (the
+    session's own script thread) blocks until each item is ready.
+    """
+    loop = get_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        # consumer stopped early (rerun, disconnect): close the generator on its loop
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import streamlit as st
+
+
+class AuditCache:
+    """
+    Extracted text of degree audits keyed by the SHA-256 of the uploaded PDF
+    bytes, and their Claude summaries keyed by the SHA-256 of that text.
+
+    Audits are student records, so they are kept for ttl_seconds at most and
+    only in an in-memory LRU by default. With cache_dir set, records are also
+    written to one JSON file per audit there, deleted once expired or when
+    the directory grows past max_disk_bytes (oldest first).
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_memory_entries: int = 64,
+                 max_disk_bytes: int = 50 * 1024 * 1024, ttl_seconds: float = 6 * 60 * 60):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._enforce_disk_cap()
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _remember(self, digest: str, record: dict):
+        # caller holds self._lock
+        self._memory[digest] = record
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _expired(self, record: dict) -> bool:
+        return time.time() - record.get("created", 0) > self.ttl_seconds
+
+    def _forget(self, digest: str):
+        with self._lock:
+            self._memory.pop(digest, None)
+        if self.cache_dir:
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def get(self, digest: str) -> Optional[dict]:
+        with self._lock:
+            record = self._memory.get(digest)
+            if record is not None:
+                self._memory.move_to_end(digest)
+        if record is None and self.cache_dir:
+            try:
+                with open(self._path(digest), "r") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                return None
+            with self._lock:
+                self._remember(digest, record)
+        if record is not None and self._expired(record):
+            self._forget(digest)
+            return None
+        return record
+
+    def put(self, digest: str, **fields) -> dict:
+        """
+        Merge fields (text, summary) into the record for digest
+        """
+        record = dict(self.get(digest) or {"created": time.time()}, **fields)
+        with self._lock:
+            self._remember(digest, record)
+        if not self.cache_dir:
+            return record
+        tmp_path = f"{self._path(digest)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self._path(digest))
+        self._enforce_disk_cap()
+        return record
+
+    def _enforce_disk_cap(self):
+        # files are only written while a record is fresh, so one last written
+        # more than ttl_seconds ago holds an expired record
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+                if now - stat.st_mtime > self.ttl_seconds:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
+
+
+@st.cache_resource(show_spinner=False)
+def get_audit_cache() -> AuditCache:
+    """
+    Process-wide AuditCache, configured by the [audit_cache] section in secrets
+    (cache_dir to enable the disk tier, max_memory_entries, max_disk_bytes,
+    ttl_seconds)
+    """
+    return AuditCache(**dict(st.secrets.get("audit_cache", {})))
@@ -1,18 +1,115 @@
-from langchain_community.document_loaders import PyPDFLoader
+import atexit
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple
+
 from pypdf import PdfReader
 
+# below this many pages the process pool costs more than it saves, even warm:
+# see benchmarks/bench_audit_extract.py
+PARALLEL_MIN_PAGES = 12
+
+# one spawn pool per process, started on the first large audit and reused
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _extract_page_range(pdf_bytes: bytes, start: int, stop: int) -> List[Tuple[int, str, float]]:
+    """
+    Extract pages [start, stop) as (page index, text, seconds)
+    """
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    pages = []
+    for i in range(start, stop):
+        page_start = time.perf_counter()
+        text = reader.pages[i].extract_text(extraction_mode='layout')
+        pages.append((i, text, time.perf_counter() - page_start))
+    return pages
+
+
+def _get_pool(workers: int) -> Tuple[ProcessPoolExecutor, int]:
+    """
+    The shared process pool and its size; the size is fixed by the first caller
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the Streamlit server process is multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool, _pool_workers
+
+
+def _drop_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+    with _pool_lock:
+        pool = _pool
+    if pool is not None:
+        _drop_pool(pool)
+
+
+atexit.register(shutdown_pool)
+
+
+def extract_pages(pdf_bytes: bytes, workers: int = None) -> List[Tuple[int, str, float]]:
+    """
+    Layout-extract every page, in page order. Layout extraction is CPU-bound,
+    so with more than one worker contiguous page ranges are split across a
+    shared process pool.
+    """
+    num_pages = len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+    workers = min(workers or os.cpu_count() or 1, num_pages)
+    if workers <= 1 or num_pages < PARALLEL_MIN_PAGES:
+        return _extract_page_range(pdf_bytes, 0, num_pages)
+
+    pool, pool_workers = _get_pool(workers)
+    step = -(-num_pages // min(workers, pool_workers))
+    ranges = [(start, min(start + step, num_pages)) for start in range(0, num_pages, step)]
+    try:
+        futures = [pool.submit(_extract_page_range, pdf_bytes, start, stop) for start, stop in ranges]
+        pages = [page for future in futures for page in future.result()]
+    except BrokenProcessPool:
+        # a worker died (e.g. killed for memory); start a fresh pool next time
+        _drop_pool(pool)
+        return _extract_page_range(pdf_bytes, 0, num_pages)
+    return sorted(pages)
+
+
+def print_timing_report(pages: List[Tuple[int, str, float]], wall_seconds: float):
+    for i, text, seconds in pages:
+        print(f"page {i + 1:3d}: {seconds * 1000:8.1f} ms  {len(text):6d} chars")
+    print(f"extracted {len(pages)} pages in {wall_seconds * 1000:.1f} ms "
+          f"(sum of page times {sum(p[2] for p in pages) * 1000:.1f} ms)")
+
 
-def extract_text_fromaudit(uploaded_file)->str:
+def extract_text_fromaudit(uploaded_file, workers: int = None, timing_report: bool = False)->str:
     """
     Extract text from uploaded degree audit
     """
-    audit_text = []
     # Load PDF
-    reader = PdfReader(uploaded_file)
-    for page in reader.pages:
-        audit_text.append(page.extract_text(extraction_mode='layout'))
+    pdf_bytes = uploaded_file.getvalue() if hasattr(uploaded_file, "getvalue") else uploaded_file.read()
+    extract_start = time.perf_counter()
+    pages = extract_pages(pdf_bytes, workers)
+    if timing_report:
+        print_timing_report(pages, time.perf_counter() - extract_start)
+    audit_text = [text for _, text, _ in pages]
 
     # check if valid degree audit
+    if not audit_text:
+        raise ValueError("The uploaded PDF has no pages")
     if len(audit_text[0]) < 2:
         return "Invalid PDF"
     
@@ -1,18 +1,30 @@
-import time
 import streamlit as st
 import google_auth_oauthlib.flow
 from googleapiclient.discovery import build
 from auth.token_manager import AuthTokenManager
+from app_config import normalize_email
 import os
 import secrets
 import logging
 import json
 import urllib.parse
+from functools import lru_cache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=8)
+def _load_client_config(secret_path: str, mtime: float) -> dict:
+    # mtime is part of the cache key so an edited secrets file is re-read
+    with open(secret_path, 'r') as f:
+        client_config = json.load(f)
+    logger.info("Loaded client secrets successfully")
+    return client_config
+
+def load_client_config(secret_path: str) -> dict:
+    return _load_client_config(secret_path, os.path.getmtime(secret_path))
+
 class Authenticator:
     def __init__(
         self,
@@ -25,7 +37,7 @@ class Authenticator:
     ):
         logger.info("Initializing Authenticator")
         st.session_state["connected"] = st.session_state.get("connected", False)
-        self.allowed_users = allowed_users
+        self.allowed_users = frozenset(normalize_email(u) for u in allowed_users)
         self.secret_path = secret_path
         self.redirect_uri = redirect_uri
         self.auth_token_manager = AuthTokenManager(
@@ -34,6 +46,8 @@ class Authenticator:
             token_duration_days=token_duration_days,
         )
         self.cookie_name = cookie_name
+        # set by check_auth while the cookie component has not reported yet
+        self.waiting_for_cookies = False
         logger.info(f"Authenticator initialized with redirect_uri: {redirect_uri}")
         logger.info(f"Allowed users: {allowed_users}")
         
@@ -47,10 +61,8 @@ class Authenticator:
             redirect_uri = "https://jiyp-proto.streamlit.app/_stcore/streamlit_oauth2_callback"
             logger.info(f"Using redirect URI: {redirect_uri}")
             
-            # Load client secrets
-            with open(self.secret_path, 'r') as f:
-                client_config = json.load(f)
-            logger.info("Loaded client secrets successfully")
+            # Client secrets are parsed once and cached per file version
+            client_config = load_client_config(self.secret_path)
             
             flow = google_auth_oauthlib.flow.Flow.from_client_config(
                 client_config,
@@ -84,7 +96,7 @@ class Authenticator:
             raise
 
     def login(self):
-        if not st.session_state["connected"]:
+        if not st.session_state["connected"] and not self.waiting_for_cookies:
             try:
                 auth_url = self.get_auth_url()
                 logger.info("Displaying login button")
@@ -95,6 +107,8 @@ class Authenticator:
 
     def check_auth(self):
         logger.info("Checking authentication status")
+        # re-evaluated on every run, the instance may outlive a rerun
+        self.waiting_for_cookies = False
         logger.info(f"Session state: {dict(st.session_state)}")
         
         if st.session_state["connected"]:
@@ -108,6 +122,18 @@ class Authenticator:
             st.session_state["connected"] = False
             return
 
+        auth_code = st.query_params.get("code")
+        logger.info(f"Auth code from query params: {auth_code}")
+
+        if not auth_code and not self.auth_token_manager.cookies_ready():
+            # The cookie component has not reported yet, so a missing token
+            # means nothing. Its first value triggers a rerun that reads the
+            # token; until then neither conclude "logged out" nor render the
+            # login button, and don't sleep either.
+            logger.info("Cookies not ready yet, waiting for cookie component")
+            self.waiting_for_cookies = True
+            return
+
         token = self.auth_token_manager.get_decoded_token()
         if token is not None:
             logger.info("Found valid token in cookies")
@@ -119,10 +145,6 @@ class Authenticator:
             }
             st.rerun()
 
-        time.sleep(1)  # important for the token to be set correctly
-
-        auth_code = st.query_params.get("code")
-        logger.info(f"Auth code from query params: {auth_code}")
         st.query_params.clear()
         
         if auth_code:
@@ -144,7 +166,7 @@ class Authenticator:
                 email = user_info.get("email")
                 logger.info(f"Processing user: {email}")
 
-                if email in self.allowed_users:
+                if email and normalize_email(email) in self.allowed_users:
                     logger.info(f"User {email} is authorized")
                     self.auth_token_manager.set_token(email, oauth_id)
                     st.session_state["connected"] = True
@@ -5,9 +5,58 @@ import extra_streamlit_components as stx
 import logging
 import os
 import json
+import base64
+import hashlib
+import hmac
+import threading
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+# token string -> verified payload, shared by all sessions in the process
+_VERIFIED_CACHE_SIZE = 4096
+_verified_tokens = OrderedDict()
+_verified_lock = threading.Lock()
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def sign_token(payload: dict, token_key: str) -> str:
+    """Compact token: base64url(json payload).base64url(HMAC-SHA256 of the first part)."""
+    body = _b64encode(json.dumps(payload, separators=(",", ":"), sort_keys=True).encode())
+    signature = hmac.new(token_key.encode(), body.encode(), hashlib.sha256).digest()
+    return f"{body}.{_b64encode(signature)}"
+
+def verify_token(token: str, token_key: str):
+    """
+    Return the payload of a correctly signed token, or None. Verified tokens
+    are cached by token string (and key) so later reruns skip the HMAC and
+    JSON work; expiry is still checked by the caller every time.
+    """
+    cache_key = (token, token_key)
+    with _verified_lock:
+        if cache_key in _verified_tokens:
+            _verified_tokens.move_to_end(cache_key)
+            return _verified_tokens[cache_key]
+
+    try:
+        body, signature = token.split(".")
+        expected = hmac.new(token_key.encode(), body.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        payload = json.loads(_b64decode(body))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+    with _verified_lock:
+        _verified_tokens[cache_key] = payload
+        while len(_verified_tokens) > _VERIFIED_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+    return payload
+
 class AuthTokenManager:
     def __init__(
         self,
@@ -16,6 +65,8 @@ class AuthTokenManager:
         token_duration_days: int,
     ):
         logger.info("Initializing AuthTokenManager")
+        if not token_key:
+            raise ValueError("token_key is required to sign auth tokens")
         self.cookie_manager = stx.CookieManager()
         self.cookie_name = cookie_name
         self.token_key = token_key
@@ -23,6 +74,21 @@ class AuthTokenManager:
         self.token = None
         logger.info(f"AuthTokenManager initialized with cookie_name: {cookie_name}")
 
+    def cookies_ready(self) -> bool:
+        """
+        Whether the cookie component has reported the browser's cookies.
+        On the very first run of a session it only returns its empty default;
+        the real value arrives with the rerun the component triggers, so an
+        empty jar is trusted from the second run on.
+        """
+        if self.cookie_manager.cookies:
+            return True
+        if st.session_state.get("auth_cookie_handshake"):
+            return True
+        st.session_state["auth_cookie_handshake"] = True
+        logger.info("Cookie component not mounted yet")
+        return False
+
     def get_decoded_token(self) -> str:
         logger.info("Attempting to get decoded token")
         self.token = self.cookie_manager.get(self.cookie_name)
@@ -41,7 +107,7 @@ class AuthTokenManager:
             "oauth_id": oauth_id,
             "exp": exp_date
         }
-        token = json.dumps(token_data)
+        token = sign_token(token_data, self.token_key)
         
         # Determine if we're in local development
         is_local = os.environ.get("STREAMLIT_SERVER_PORT") == "8501"
@@ -77,7 +143,12 @@ class AuthTokenManager:
     def _decode_token(self) -> str:
         try:
             logger.info("Decoding token")
-            decoded = json.loads(self.token)
+            decoded = verify_token(self.token, self.token_key)
+            if decoded is None:
+                # unsigned (legacy) or tampered cookie
+                logger.warning("Token signature is invalid")
+                self.delete_token()
+                return None
             if datetime.fromtimestamp(decoded["exp"]) < datetime.now():
                 logger.warning("Token has expired")
                 st.toast(":red[token expired, please login]")
@@ -0,0 +1,75 @@
+"""
+Latency removed from upload_degree_audit by dropping the dummy retrieval:
+the old path ran a max_tokens=1 gpt-4o-mini rewrite (when there was chat
+history) and a zero-vector search on umich_fa2024 before tara_chain; the new
+path only injects an empty context.
+
+Run from the repo root:
+
+    python benchmarks/bench_audit_chain.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb  # noqa: E402
+import streamlit as st  # noqa: E402
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from langchain_core.output_parsers import StrOutputParser  # noqa: E402
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder  # noqa: E402
+from langchain_core.runnables import RunnablePassthrough  # noqa: E402
+from langchain_openai import ChatOpenAI  # noqa: E402
+
+SAMPLE_HISTORY = [
+    HumanMessage(content="What should I eat for lunch today?"),
+    AIMessage(content="A grain bowl with grilled chicken and greens would fit your goals. Any allergies?"),
+]
+
+
+def timed(fn, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list):
+    print(f"{name:<28} p50 {statistics.median(timings):9.2f} ms | max {max(timings):9.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path="./chroma_db").get_collection("umich_fa2024")
+    zero_search = timed(lambda: collection.query(query_embeddings=[[0.0] * 1024], n_results=1), args.runs)
+
+    with open("retriever_prompt.txt", "r") as f:
+        retriever_prompt = f.read()
+    rewrite = (
+        ChatPromptTemplate.from_messages(
+            [("system", retriever_prompt), MessagesPlaceholder("chat_history"), ("human", "{input}")]
+        ).partial(user_specific_conditions="", dietary_preferences="", nutritional_goals="")
+        | ChatOpenAI(temperature=0.7, model="gpt-4o-mini-2024-07-18",
+                     api_key=st.secrets["api_keys"]["OPENAI_API_KEY"], max_tokens=1)
+        | StrOutputParser()
+    )
+    dummy_rewrite = timed(
+        lambda: rewrite.invoke({"input": "Audit summary ...", "chat_history": SAMPLE_HISTORY}), args.runs
+    )
+
+    empty_context = RunnablePassthrough.assign(context=lambda x: [])
+    new_path = timed(lambda: empty_context.invoke({"input": "Audit summary ...", "chat_history": []}), args.runs)
+
+    report("old: zero-vector search", zero_search)
+    report("old: max_tokens=1 rewrite", dummy_rewrite)
+    report("new: empty context", new_path)
+    removed = statistics.median(zero_search) + statistics.median(dummy_rewrite) - statistics.median(new_path)
+    print(f"removed per audit upload (p50, with history): {removed:.1f} ms")
@@ -0,0 +1,76 @@
+"""
+Where the process pool in audit_parse.extract_pages starts to pay off: serial
+layout extraction against the shared (warm) spawn pool, and against a pool
+started per call as extract_pages used to do, for the first N pages of an
+audit PDF. PARALLEL_MIN_PAGES should sit where the warm pool first wins.
+
+Run from the repo root:
+
+    python benchmarks/bench_audit_extract.py audit.pdf --pages 1 4 8 12 16 24 --runs 5
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pypdf import PdfReader, PdfWriter  # noqa: E402
+
+import audit_parse  # noqa: E402
+
+
+def first_pages(pdf_bytes: bytes, num_pages: int) -> bytes:
+    writer = PdfWriter()
+    for page in PdfReader(io.BytesIO(pdf_bytes)).pages[:num_pages]:
+        writer.add_page(page)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def timed(fn, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def per_call_pool(pdf_bytes: bytes, workers: int):
+    num_pages = len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+    step = -(-num_pages // workers)
+    ranges = [(start, min(start + step, num_pages)) for start in range(0, num_pages, step)]
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(audit_parse._extract_page_range, pdf_bytes, start, stop) for start, stop in ranges]
+        return [page for future in futures for page in future.result()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 4, 8, 12, 16, 24])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        pdf_bytes = f.read()
+    # measure the pool on every size, not only above the current threshold
+    audit_parse.PARALLEL_MIN_PAGES = 1
+    # start the shared pool before timing it, as a running server would have
+    audit_parse.extract_pages(first_pages(pdf_bytes, 2), args.workers)
+
+    print(f"{args.workers} workers, median of {args.runs} runs")
+    for num_pages in args.pages:
+        sample = first_pages(pdf_bytes, num_pages)
+        serial = timed(lambda: audit_parse.extract_pages(sample, 1), args.runs)
+        warm = timed(lambda: audit_parse.extract_pages(sample, args.workers), args.runs)
+        cold = timed(lambda: per_call_pool(sample, min(args.workers, num_pages)), args.runs)
+        print(f"{num_pages:3d} pages: serial {serial:8.1f} ms | shared pool {warm:8.1f} ms | "
+              f"pool per call {cold:8.1f} ms")
@@ -0,0 +1,71 @@
+"""
+Startup time and RSS per session: one LMMentorBot per session (old dashboard
+behaviour) vs the shared process-wide engine.
+
+Run from the repo root so ./chroma_db, the prompt files and
+.streamlit/secrets.toml resolve:
+
+    python benchmarks/bench_engine.py --sessions 10
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import uuid
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_responses import LMMentorBot  # noqa: E402
+
+
+def rss_mb() -> float:
+    gc.collect()
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def bench_per_session(sessions: int):
+    bots = []
+    timings = []
+    base = rss_mb()
+    for _ in range(sessions):
+        start = time.perf_counter()
+        bots.append(LMMentorBot())
+        timings.append(time.perf_counter() - start)
+    return timings, (rss_mb() - base) / sessions
+
+
+def bench_shared(sessions: int):
+    timings = []
+    base = rss_mb()
+    start = time.perf_counter()
+    bot = LMMentorBot()
+    timings.append(time.perf_counter() - start)
+    for _ in range(sessions - 1):
+        start = time.perf_counter()
+        # a new session only needs its own history key
+        bot.conversational_rag_chain.get_session_history(uuid.uuid4().hex)
+        timings.append(time.perf_counter() - start)
+    return timings, (rss_mb() - base) / sessions
+
+
+def report(name: str, timings: list, rss_per_session: float):
+    cold = timings[0]
+    warm = sorted(timings[1:]) or [cold]
+    print(f"{name:<12} first session {cold * 1000:9.1f} ms | "
+          f"later sessions p50 {warm[len(warm) // 2] * 1000:9.3f} ms | "
+          f"RSS/session {rss_per_session:7.2f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--mode", choices=["both", "per-session", "shared"], default="both")
+    args = parser.parse_args()
+
+    if args.mode in ("both", "per-session"):
+        report("per-session", *bench_per_session(args.sessions))
+    if args.mode in ("both", "shared"):
+        report("shared", *bench_shared(args.sessions))
@@ -0,0 +1,75 @@
+"""
+Login page render latency for an unauthenticated visitor, measured with
+Streamlit's AppTest, from a fresh session to the first render of the login
+button. --legacy runs the baseline flow instead (no cookie readiness gate,
+client secrets re-read from disk on every flow, time.sleep(1)) for a
+before/after comparison.
+
+Run from the repo root:
+
+    python benchmarks/bench_login.py --runs 10
+    python benchmarks/bench_login.py --runs 10 --legacy
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APP = """
+import sys
+import time
+sys.path.insert(0, {root!r})
+import auth.authenticate as authenticate
+from auth import Authenticator
+
+authenticator = Authenticator(
+    allowed_users=["someone@umich.edu"],
+    secret_path={secret_path!r},
+    redirect_uri="http://localhost:8501",
+    token_key="benchmark-key",
+)
+if {legacy!r}:
+    # the baseline check_auth: no cookie readiness gate, a one second sleep
+    # and the client secrets parsed again for every flow
+    authenticator.auth_token_manager.cookies_ready = lambda: True
+    authenticate._load_client_config.cache_clear()
+    time.sleep(1)
+authenticator.check_auth()
+authenticator.login()
+"""
+
+
+def render_times(legacy: bool, runs: int, max_reruns: int = 3) -> list:
+    script = APP.format(root=ROOT, legacy=legacy, secret_path=os.path.join(ROOT, "client_secrets.template.json"))
+    timings = []
+    for _ in range(runs):
+        # a fresh AppTest is a fresh browser session; time the runs up to the
+        # first one that renders the login button (the current flow waits one
+        # rerun for the cookie component, the baseline rendered it right away)
+        app = AppTest.from_string(script, default_timeout=30)
+        start = time.perf_counter()
+        for _ in range(max_reruns):
+            app.run()
+            if app.get("link_button"):
+                break
+        else:
+            raise RuntimeError(f"login button not rendered within {max_reruns} runs")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    timings = render_times(args.legacy, args.runs)
+    label = "legacy" if args.legacy else "current"
+    print(f"{label:<8} login render p50 {statistics.median(timings):8.1f} ms | max {max(timings):8.1f} ms")
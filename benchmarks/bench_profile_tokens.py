@@ -0,0 +1,66 @@
+"""
+Prompt tokens spent on the user profile per turn: the old dashboard prepended
+the whole profile block to every message (so it was also stored in, and
+re-sent with, the chat history), while the profile now goes in once per turn
+through the prompt variables.
+
+Runs offline, only tiktoken is needed:
+
+    python benchmarks/bench_profile_tokens.py --turns 10
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from token_counter import count_tokens  # noqa: E402
+from user_profile import UserProfile  # noqa: E402
+
+PROFILE = UserProfile(
+    age=25, gender="Female", weight=140.0, height=65, dietary_restrictions=("Vegetarian", "Dairy-Free"),
+    allergies="peanuts, shellfish", health_conditions="pre-diabetic", primary_goal="Weight Loss",
+    activity_level="Moderately Active",
+)
+
+# the context string dashboard.py used to build on form submit
+LEGACY_CONTEXT = f"""
+            User Profile:
+            - Age: {PROFILE.age}
+            - Gender: {PROFILE.gender}
+            - Weight: {PROFILE.weight} lbs
+            - Height: {PROFILE.height} inches
+            - Dietary Restrictions: {', '.join(PROFILE.dietary_restrictions)}
+            - Allergies: {PROFILE.allergies}
+            - Health Conditions: {PROFILE.health_conditions}
+            - Primary Goal: {PROFILE.primary_goal}
+            - Activity Level: {PROFILE.activity_level}
+            """
+
+PROFILE_MESSAGE = (
+    "User profile: {user_profile}\n"
+    "Dietary preferences: {dietary_preferences}\n"
+    "Nutritional goals: {nutritional_goals}\n"
+    "Health conditions and allergies: {user_specific_conditions}"
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    variables = PROFILE.prompt_variables()
+    legacy_block = count_tokens(f"{LEGACY_CONTEXT}\n\nUser: ")
+    new_block = count_tokens(PROFILE_MESSAGE.format(**variables))
+
+    print(f"profile block: legacy {legacy_block} tokens, now {new_block} tokens")
+    legacy_total = new_total = 0
+    for turn in range(1, args.turns + 1):
+        # legacy: the block rides along in the new message and in every earlier one in history
+        legacy_turn = legacy_block * turn
+        legacy_total += legacy_turn
+        new_total += new_block
+        print(f"turn {turn:3d}: legacy {legacy_turn:6d}  now {new_block:6d}  saved {legacy_turn - new_block:6d}")
+    print(f"total over {args.turns} turns: legacy {legacy_total}, now {new_total}, "
+          f"saved {legacy_total - new_total} ({100 * (legacy_total - new_total) / legacy_total:.0f}%)")
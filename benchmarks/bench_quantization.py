@@ -0,0 +1,86 @@
+"""
+Quantized vector search: recall@k against exact float search, bytes of the
+matrix each query scans (the part that stays resident per worker), process
+RSS growth and query latency for float, int8 and binary with several
+re-scoring depths.
+
+Queries are stored vectors with a little Gaussian noise, so no embedding
+calls are made. Export the index first (`python mmap_index.py export`),
+then run from the repo root:
+
+    python benchmarks/bench_quantization.py --queries 200 --rescore 1 4 10
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from active_collection import read_active_collection  # noqa: E402
+from mmap_index import MmapVectorIndex, default_index_path  # noqa: E402
+
+
+def rss_mb() -> float:
+    gc.collect()
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def run(index: MmapVectorIndex, queries: np.ndarray, k: int):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append({i for i, _ in index.search(query, k)})
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def report(name: str, index: MmapVectorIndex, rss_delta: float, latencies: list, results: list, baseline: list, k: int):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    recall = statistics.mean(len(r & b) / len(b) for r, b in zip(results, baseline) if b)
+    print(f"{name:<18} recall@{k} {recall:.3f} | scanned {index.scan_bytes / 2 ** 20:8.1f} MB | "
+          f"RSS +{rss_delta:7.1f} MB | p50 {statistics.median(latencies):7.3f} ms p95 {p95:7.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=None, help="defaults to the active collection's export")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 4, 10])
+    parser.add_argument("--noise", type=float, default=0.02)
+    args = parser.parse_args()
+
+    path = args.path or default_index_path(read_active_collection())
+
+    def load(quantization: str, rescore: int = 4):
+        before = rss_mb()
+        index = MmapVectorIndex(path, quantization=quantization, rescore=rescore)
+        # one pass to fault in the pages this mode actually touches
+        run(index, queries[:5], args.k)
+        return index, rss_mb() - before
+
+    probe = MmapVectorIndex(path)
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(probe), size=min(args.queries, len(probe)), replace=False)
+    queries = np.asarray(probe.vectors[rows]) + rng.normal(0, args.noise, size=(len(rows), probe.vectors.shape[1]))
+    queries = queries.astype(np.float32)
+    print(f"{len(probe)} vectors of dim {probe.vectors.shape[1]}, {len(queries)} queries")
+    del probe
+
+    index, rss_delta = load("none")
+    baseline, latencies = run(index, queries, args.k)
+    report("float32", index, rss_delta, latencies, baseline, baseline, args.k)
+    del index
+    for quantization in ("int8", "binary"):
+        for rescore in args.rescore:
+            index, rss_delta = load(quantization, rescore)
+            results, latencies = run(index, queries, args.k)
+            report(f"{quantization} rescore={rescore}", index, rss_delta, latencies, results, baseline, args.k)
+            del index
@@ -0,0 +1,101 @@
+"""
+Retrieval quality and latency: the old similarity_score_threshold retriever
+(k=10) vs hybrid BM25 + vector retrieval at lower k.
+
+The eval set is a JSONL file, one query per line, with the text snippets a
+relevant chunk must contain (matched case-insensitively):
+
+    {"query": "calories in the Mojo burrito bowl", "relevant": ["burrito bowl"]}
+
+Lines may carry a profile, "dietary_restrictions" (dashboard options) and
+"allergies"; those queries are also run with the profile's metadata filter,
+allergens only and allergens plus diet, to show the recall the filters cost.
+
+Reports hit rate (any relevant chunk retrieved), MRR, context tokens handed
+to the LLM and per-query latency. [retrieval] mode = "hybrid" should only be
+enabled for a k whose hit rate is at least that of similarity k=10. Run from
+the repo root:
+
+    python benchmarks/bench_retrieval.py --eval retrieval_eval.jsonl --k 3 5 8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hybrid_retrieval import HybridRetriever  # noqa: E402
+from metadata_filters import profile_filter  # noqa: E402
+from retrieval import Retriever  # noqa: E402
+from token_counter import count_tokens  # noqa: E402
+
+
+def load_eval(path: str) -> list:
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def first_relevant_rank(docs, relevant) -> int:
+    snippets = [s.lower() for s in relevant]
+    for rank, doc in enumerate(docs, start=1):
+        text = doc.page_content.lower()
+        if any(s in text for s in snippets):
+            return rank
+    return 0
+
+
+def with_filter(retriever, where):
+    if not where:
+        return retriever
+    return retriever.copy(update={"search_kwargs": {**retriever.search_kwargs, "filter": where}})
+
+
+def evaluate(name: str, retriever, queries: list, where_for=None):
+    hits, reciprocal_ranks, tokens, latencies = 0, [], [], []
+    for item in queries:
+        start = time.perf_counter()
+        docs = with_filter(retriever, where_for(item) if where_for else None).invoke(item["query"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        rank = first_relevant_rank(docs, item["relevant"])
+        hits += rank > 0
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        tokens.append(sum(count_tokens(doc.page_content) for doc in docs))
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<36} hit rate {hits / len(queries):6.1%} | MRR {statistics.mean(reciprocal_ranks):.3f} | "
+          f"context {statistics.mean(tokens):7.0f} tokens | "
+          f"latency p50 {statistics.median(latencies):7.1f} ms p95 {p95:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eval", required=True, help="JSONL eval set")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--fetch-k", type=int, default=20)
+    args = parser.parse_args()
+
+    queries = load_eval(args.eval)
+    retriever = Retriever()
+    # warm the embedding cache so both retrievers pay the same query embedding cost
+    for item in queries:
+        retriever.embeddings.embed_query(item["query"])
+
+    evaluate("similarity k=10", retriever.retriver_sim, queries)
+    vector_store = retriever.retriver_sim.vectorstore
+    hybrid = getattr(retriever, "retriver_hybrid", None) or HybridRetriever.from_chroma(vector_store)
+    for k in args.k:
+        evaluate(f"hybrid k={k}", HybridRetriever(
+            vector_store=vector_store, bm25=hybrid.bm25, k=k, fetch_k=args.fetch_k), queries)
+
+    profiled = [item for item in queries if item.get("dietary_restrictions") or item.get("allergies")]
+    if profiled:
+        print(f"\n{len(profiled)} queries with a profile")
+        evaluate("similarity k=10 no filter", retriever.retriver_sim, profiled)
+        evaluate("similarity k=10 allergen filter", retriever.retriver_sim, profiled,
+                 lambda item: profile_filter([], item.get("allergies", "")))
+        evaluate("similarity k=10 allergen + diet filter", retriever.retriver_sim, profiled,
+                 lambda item: profile_filter(item.get("dietary_restrictions", []), item.get("allergies", "")))
@@ -0,0 +1,76 @@
+"""
+Vector lookup latency: Chroma (PersistentClient query) vs the memory-mapped
+export searched with simsimd and with plain numpy. Queries are stored
+vectors, so no embedding calls are made. Export the index first, then run
+from the repo root:
+
+    python mmap_index.py export
+    python benchmarks/bench_vector_backend.py --queries 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pysqlite3
+    sys.modules['sqlite3'] = pysqlite3
+except ImportError:
+    pass
+import chromadb  # noqa: E402
+
+import mmap_index  # noqa: E402
+from active_collection import read_active_collection  # noqa: E402
+from mmap_index import MmapVectorIndex, default_index_path  # noqa: E402
+
+
+def timed(search, queries: np.ndarray):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def report(name: str, latencies: list, results: list, baseline: list, k: int):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    overlap = statistics.mean(len(set(r) & set(b)) / k for r, b in zip(results, baseline))
+    print(f"{name:<16} p50 {statistics.median(latencies):8.3f} ms | p95 {p95:8.3f} ms | overlap@{k} {overlap:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    name = read_active_collection(args.persist_directory)
+    collection = chromadb.PersistentClient(path=args.persist_directory).get_collection(name)
+    index = MmapVectorIndex(default_index_path(name, args.persist_directory))
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(index), size=min(args.queries, len(index)), replace=False)
+    queries = np.asarray(index.vectors[rows])
+    print(f"{name}: {len(index)} vectors of dim {index.vectors.shape[1]}, {len(queries)} queries")
+
+    def chroma_search(query):
+        return collection.query(query_embeddings=[query.tolist()], n_results=args.k, include=[])["ids"][0]
+
+    def mmap_search(query):
+        return [index.ids[i] for i, _ in index.search(query, args.k)]
+
+    baseline, latencies = timed(chroma_search, queries)
+    report("chroma", latencies, baseline, baseline, args.k)
+    if mmap_index.simsimd is not None:
+        results, latencies = timed(mmap_search, queries)
+        report("mmap simsimd", latencies, results, baseline, args.k)
+    mmap_index.simsimd = None
+    results, latencies = timed(mmap_search, queries)
+    report("mmap numpy", latencies, results, baseline, args.k)
@@ -0,0 +1,86 @@
+"""
+Reranking eval: the retrieved candidates passed straight to the LLM vs the
+same candidates reranked and pruned by each scorer.
+
+Uses the JSONL eval set of bench_retrieval.py; lines may also list snippets
+the answer must contain, checked with --generate:
+
+    {"query": "...", "relevant": ["..."], "answer": ["..."]}
+
+Reports hit rate, MRR, context tokens, rerank latency and, with --generate,
+answer hit rate and generation latency through tara_chain. Run from the
+repo root:
+
+    python benchmarks/eval_rerank.py --eval retrieval_eval.jsonl --scorers lexical cross_encoder --generate
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_retrieval import first_relevant_rank, load_eval  # noqa: E402
+from rerank import Reranker, build_scorer  # noqa: E402
+from retrieval import Retriever  # noqa: E402
+from token_counter import count_tokens  # noqa: E402
+
+
+def generate(bot, query: str, docs) -> tuple:
+    start = time.perf_counter()
+    answer = bot.tara_chain.invoke({"input": query, "context": docs, "chat_history": []})
+    return answer, (time.perf_counter() - start) * 1000
+
+
+def evaluate(name: str, queries: list, candidates: list, prune, bot=None):
+    hits, reciprocal_ranks, tokens, rerank_ms = 0, [], [], []
+    answer_hits, generation_ms = 0, []
+    for item, docs in zip(queries, candidates):
+        start = time.perf_counter()
+        docs = prune(item["query"], docs)
+        rerank_ms.append((time.perf_counter() - start) * 1000)
+        rank = first_relevant_rank(docs, item["relevant"])
+        hits += rank > 0
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        tokens.append(sum(count_tokens(doc.page_content) for doc in docs))
+        if bot is not None:
+            answer, ms = generate(bot, item["query"], docs)
+            generation_ms.append(ms)
+            answer_hits += any(s.lower() in answer.lower() for s in item.get("answer", []))
+
+    line = (f"{name:<40} hit rate {hits / len(queries):6.1%} | MRR {statistics.mean(reciprocal_ranks):.3f} | "
+            f"context {statistics.mean(tokens):7.0f} tokens | rerank {statistics.median(rerank_ms):7.2f} ms")
+    if bot is not None:
+        line += (f" | answer hit rate {answer_hits / len(queries):6.1%} | "
+                 f"generation {statistics.median(generation_ms):7.0f} ms")
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eval", required=True, help="JSONL eval set")
+    parser.add_argument("--scorers", nargs="+", default=["lexical"], choices=["lexical", "cross_encoder"])
+    parser.add_argument("--model", default=None, help="cross-encoder model name")
+    parser.add_argument("--top-n", type=int, nargs="+", default=[3, 4])
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--generate", action="store_true", help="also answer every query with tara_chain")
+    args = parser.parse_args()
+
+    queries = load_eval(args.eval)
+    retriever = Retriever()
+    base = retriever.rag_retriever.default
+    base = base.base_retriever if retriever.reranker else base
+    candidates = [base.invoke(item["query"]) for item in queries]
+
+    bot = None
+    if args.generate:
+        from chat_responses import LMMentorBot
+        bot = LMMentorBot()
+
+    evaluate("no rerank", queries, candidates, lambda query, docs: docs, bot)
+    for scorer_name in args.scorers:
+        scorer = build_scorer(scorer_name, args.model)
+        for top_n in args.top_n:
+            reranker = Reranker(scorer, top_n=top_n, max_tokens=args.max_tokens)
+            evaluate(f"{scorer.name} top_n={top_n}", queries, candidates, reranker.rerank, bot)
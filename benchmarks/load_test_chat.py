@@ -0,0 +1,91 @@
+"""
+Concurrency ceiling of chat_stream (one blocked thread per in-flight turn)
+vs achat_stream (all turns multiplexed on one event loop).
+
+Each level starts that many simultaneous sessions, each sending one
+question; the sync path is capped at --threads workers to model a fixed
+thread budget. Reports wall time, throughput and time-to-first-token.
+Run from the repo root:
+
+    python benchmarks/load_test_chat.py --levels 1 8 32 64 --threads 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_responses import LMMentorBot  # noqa: E402
+from user_profile import UserProfile  # noqa: E402
+
+PROFILE = UserProfile(
+    age=25, gender="Female", weight=140.0, height=65, dietary_restrictions=("Vegetarian",),
+    allergies="peanuts", health_conditions="", primary_goal="General Health", activity_level="Moderately Active",
+)
+
+QUESTIONS = [
+    "How much protein is in a cup of greek yogurt?",
+    "Suggest a vegetarian dinner under 600 calories",
+    "Is oatmeal a good breakfast for weight loss?",
+    "What are good sources of iron for vegans?",
+]
+
+
+def sync_turn(bot: LMMentorBot, i: int) -> float:
+    start = time.perf_counter()
+    ttft = None
+    for _ in bot.chat_stream(QUESTIONS[i % len(QUESTIONS)], uuid.uuid4().hex, PROFILE):
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft or 0.0
+
+
+async def async_turn(bot: LMMentorBot, i: int) -> float:
+    start = time.perf_counter()
+    ttft = None
+    async for _ in bot.achat_stream(QUESTIONS[i % len(QUESTIONS)], uuid.uuid4().hex, PROFILE):
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft or 0.0
+
+
+def run_sync(bot: LMMentorBot, sessions: int, threads: int):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        ttfts = list(pool.map(lambda i: sync_turn(bot, i), range(sessions)))
+    return time.perf_counter() - start, ttfts
+
+
+def run_async(bot: LMMentorBot, sessions: int):
+    async def main():
+        return await asyncio.gather(*(async_turn(bot, i) for i in range(sessions)))
+
+    start = time.perf_counter()
+    ttfts = asyncio.run(main())
+    return time.perf_counter() - start, ttfts
+
+
+def report(name: str, sessions: int, wall: float, ttfts: list):
+    ttfts = sorted(ttfts)
+    p95 = ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.95))]
+    print(f"{name:<6} sessions {sessions:4d} | wall {wall:7.2f} s | {sessions / wall:6.2f} turns/s | "
+          f"TTFT p50 {statistics.median(ttfts):6.2f} s p95 {p95:6.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    bot = LMMentorBot()
+    # responses would otherwise be served from the cache after the first level
+    bot.response_cache = None
+    for sessions in args.levels:
+        report("sync", sessions, *run_sync(bot, sessions, args.threads))
+        report("async", sessions, *run_async(bot, sessions))
@@ -7,29 +7,37 @@ sys.modules['sqlite3'] = sqlite3
 sys.modules['pysqlite3'] = sqlite3 
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.output_parsers import StrOutputParser
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain.chains import create_history_aware_retriever
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 import os
 import asyncio
 from typing import AsyncGenerator
 from langsmith import Client 
 import streamlit as st
 from retrieval import Retriever
+from history_store import SessionHistoryStore
+from history_compaction import HistoryCompactor
+from query_rewrite import build_history_aware_retriever
+from response_cache import ResponseCache
+from user_profile import EMPTY_PROMPT_VARIABLES, UserProfile
+from prompts import get_prompt, report_token_counts
+from audit_cache import get_audit_cache
+from context_packing import ContextPacker
 
 
 
 
 class LMMentorBot:
-
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    """
+    Shared chat engine. Clients, prompts and chains are built once per process
+    and never mutated afterwards; the only per-user state is the chat history,
+    which is looked up by session_id on every call.
+    """
 
     def __init__(self):
 
@@ -43,59 +51,57 @@ class LMMentorBot:
 
         print("Initializing RAG system")
         retriever = Retriever()
+        self.retriever = retriever
 
-        # create retrievers for audit(dummy) and chat(rag)
-        rag_retriver = retriever.retriver_sim
-        dummy_retriever = retriever.retriever_dummy
+        # retriever for chat (rag), audit summaries skip retrieval entirely
+        rag_retriver = retriever.rag_retriever
 
         print("Initializing LLM")
         llm = ChatOpenAI(temperature=0.7, model= "gpt-4o-mini-2024-07-18", api_key=st.secrets["api_keys"]["OPENAI_API_KEY"], streaming=True)
         audit_summary_llm = ChatAnthropic(temperature=0.7, model="claude-3-5-sonnet-20240620", api_key=st.secrets["api_keys"]["ANTHROPIC_API_KEY"])
-        dummy_llm = ChatOpenAI(temperature=0.7, model= "gpt-4o-mini-2024-07-18", api_key=st.secrets["api_keys"]["OPENAI_API_KEY"], max_tokens=1)
-
-        # 
-        with open("retriever_prompt.txt", "r") as f:
-            retriever_prompt = f.read()
-
-        with open("audit_summary_prompt.txt", "r") as f:
-            audit_summary_prompt = f.read()
+        summary_llm = ChatOpenAI(temperature=0, model= "gpt-4o-mini-2024-07-18", api_key=st.secrets["api_keys"]["OPENAI_API_KEY"], max_tokens=400)
 
-        with open("tara_prompt.txt", "r") as f:
-            tara_prompt = f.read()
+        # prompts are loaded, validated and token-counted once per process
+        report_token_counts()
+        retriever_prompt = get_prompt("retriever")
+        audit_summary_prompt = get_prompt("audit_summary")
+        tara_prompt = get_prompt("tara")
         
         retriever_template = ChatPromptTemplate.from_messages(
             [
-                ("system", retriever_prompt),
+                ("system", retriever_prompt.text),
                 MessagesPlaceholder("chat_history"),
                 ("human", "{input}"),
             ]
-        )
+        ).partial(**EMPTY_PROMPT_VARIABLES)
 
+        # The fixed system prompt comes first and unchanged on every call so
+        # OpenAI serves it from its cached prefix; per-user and per-turn parts follow.
         tara_prompt_template = ChatPromptTemplate.from_messages(
             [
-                ("system", tara_prompt),
+                ("system", tara_prompt.static_prefix),
+                ("system", "User profile: {user_profile}\n"
+                           "Dietary preferences: {dietary_preferences}\n"
+                           "Nutritional goals: {nutritional_goals}\n"
+                           "Health conditions and allergies: {user_specific_conditions}\n\n"
+                           + tara_prompt.dynamic_suffix),
                 MessagesPlaceholder("chat_history"),
                 ("human", "{input}"),
             ]
-        ).partial(
-            dietary_preferences="",  # Will be filled from user context
-            nutritional_goals="",    # Will be filled from user context
-            user_specific_conditions=""  # Will be filled from user context
-        )
-        audit_summary_template = ChatPromptTemplate.from_template(audit_summary_prompt)
+        ).partial(**EMPTY_PROMPT_VARIABLES)  # Will be filled from the UserProfile
+        audit_summary_template = ChatPromptTemplate.from_template(audit_summary_prompt.text)
 
-        history_aware_retriever = create_history_aware_retriever(
-            llm, rag_retriver, retriever_template
-        )
-
-        audit_retrevier = create_history_aware_retriever(
-            dummy_llm, dummy_retriever, retriever_template
+        # skips the rewrite call for first turns and self-contained questions
+        # [query_rewrite] section in secrets: mode ("always" | "auto" | "race"), race_min_docs
+        history_aware_retriever = build_history_aware_retriever(
+            llm, rag_retriver, retriever_template, **dict(st.secrets.get("query_rewrite", {}))
         )
 
         print("Creating RAG chain")
         
         #create chain to insert documents for context (rag documents)
         tara_chain = create_stuff_documents_chain(llm, tara_prompt_template)
+        self.tara_chain = tara_chain
 
         # chain that retrieves documents and then passes them to the question_answer_chain
         self.audit_summary_chain = audit_summary_template | audit_summary_llm
@@ -103,17 +109,38 @@ class LMMentorBot:
         #     {"input": audit_summary_chain},
         # )
 
-        rag_chain = create_retrieval_chain(history_aware_retriever, tara_chain)
-        audit_text_chain = create_retrieval_chain(audit_retrevier, tara_chain)
+        # keep the last turns verbatim and fold older ones into a running summary
+        # [history_compaction] section in secrets: keep_turns, max_tokens
+        self.history_compactor = HistoryCompactor(summary_llm, **dict(st.secrets.get("history_compaction", {})))
+        compact_history = RunnablePassthrough.assign(chat_history=self.history_compactor.as_runnable())
+
+        # dedup near-identical chunks, merge neighbours from the same source and
+        # cut the context to a token budget before it is stuffed into the prompt
+        # [context_packing] section in secrets: max_tokens, dedup_threshold, merge_adjacent
+        self.context_packer = ContextPacker(**dict(st.secrets.get("context_packing", {})))
+        packed_retriever = history_aware_retriever | self.context_packer.as_runnable()
+
+        rag_chain = compact_history | create_retrieval_chain(packed_retriever, tara_chain)
+        # audit summaries go straight into tara_chain with an empty context
+        audit_text_chain = (
+            compact_history
+            | RunnablePassthrough.assign(context=lambda x: [])
+            | RunnablePassthrough.assign(answer=tara_chain)
+        )
+
+        # [response_cache] section in secrets: enabled, semantic, similarity_threshold, max_entries, ttl_seconds
+        cache_config = dict(st.secrets.get("response_cache", {}))
+        self.response_cache = None
+        if cache_config.pop("enabled", True):
+            semantic = cache_config.pop("semantic", False)
+            self.response_cache = ResponseCache(embeddings=retriever.embeddings if semantic else None, **cache_config)
 
         print("Creating chat history")
-        self.store = {}
+        # [history] section in secrets: max_sessions, ttl_seconds, max_messages, max_tokens, sqlite_path
+        self.store = SessionHistoryStore(**dict(st.secrets.get("history", {})))
 
         def get_session_history(session_id: str) -> BaseChatMessageHistory:
-            if session_id not in self.store:
-                print("Creating new chat history for session_id", session_id)
-                self.store[session_id] = ChatMessageHistory()
-            return self.store[session_id]
+            return self.store.get(session_id)
 
 
         self.conversational_rag_chain = RunnableWithMessageHistory(
@@ -132,74 +159,123 @@ class LMMentorBot:
             output_messages_key="answer",
         )
 
-    def upload_degree_audit(self, text: str):
+    def upload_degree_audit(self, text: str, session_id: str):
         print("Uploading degree audit")
-        audit_summary = self.audit_summary_chain.invoke({"audit": text})
+        # summaries are keyed by the extracted text, so the same audit
+        # re-exported to a different PDF still reuses its summary
+        audit_cache = get_audit_cache()
+        audit_digest = audit_cache.digest(text.encode())
+        audit_summary = (audit_cache.get(audit_digest) or {}).get("summary")
+        if audit_summary is None:
+            audit_summary = self.audit_summary_chain.invoke({"audit": text}).content
+            audit_cache.put(audit_digest, summary=audit_summary)
         print("Finished summarizing audit")
         for chunk in self.conversational_chain_no_rag.stream(
-            {"input": audit_summary.content},
+            {"input": audit_summary},
                 config={
-                    "configurable": {"session_id": "abc123"}
-                },  # constructs a key "abc123" in `store`.
+                    "configurable": {"session_id": session_id}
+                },  # constructs a key session_id in `store`.
             ):
             if 'answer' in chunk.keys():
                 yield chunk.get("answer")
             else:
                 continue
-        print(self.store["abc123"])
+        print(self.store.get(session_id))
 
-    def chat(self, text: str) -> str:
+    def chat(self, text: str, session_id: str) -> str:
         print("Chatting with Jeeves")
         response = self.conversational_rag_chain.invoke(
             {"input": text},
                 config={
-                    "configurable": {"session_id": "abc123"}
-                },  # constructs a key "abc123" in `store`.
+                    "configurable": {"session_id": session_id}
+                },  # constructs a key session_id in `store`.
             )["answer"]
-        print(self.store["abc123"])
+        print(self.store.get(session_id))
         return response
     
-    def chat_stream(self, text: str):
+    def chat_stream(self, text: str, session_id: str, profile: UserProfile = None):
         print("Chatting with Jeeves")
         
-        # Extract user context from session state
-        user_context = st.session_state.get("user_context", "")
-        
-        # Parse the context into the required variables
-        dietary_preferences = ""
-        nutritional_goals = ""
-        user_specific_conditions = ""
-        
-        if user_context:
-            # Extract dietary preferences
-            if "Dietary Restrictions:" in user_context:
-                dietary_preferences = user_context.split("Dietary Restrictions:")[1].split("\n")[0].strip()
-            
-            # Extract nutritional goals
-            if "Primary Goal:" in user_context:
-                nutritional_goals = user_context.split("Primary Goal:")[1].split("\n")[0].strip()
-            
-            # Extract user specific conditions
-            conditions = []
-            if "Health Conditions:" in user_context:
-                conditions.append(user_context.split("Health Conditions:")[1].split("\n")[0].strip())
-            if "Allergies:" in user_context:
-                conditions.append(user_context.split("Allergies:")[1].split("\n")[0].strip())
-            user_specific_conditions = ", ".join(filter(None, conditions))
+        # Profile reaches the model only through the prompt variables
+        if profile is None:
+            profile = st.session_state.get("user_profile")
+        prompt_variables = profile.prompt_variables() if profile else EMPTY_PROMPT_VARIABLES
         
+        # answers are only cached for opening questions, later turns depend on the history
+        history = self.store.get(session_id)
+        cacheable = self.response_cache is not None and not history.messages
+        if cacheable:
+            fingerprint = profile.fingerprint() if profile else ""
+            cached = self.response_cache.lookup(text, fingerprint)
+            if cached is not None:
+                print("Serving cached response")
+                history.add_user_message(text)
+                history.add_ai_message("".join(cached))
+                yield from self.response_cache.replay(cached)
+                return
+
+        chunks = []
         for chunk in self.conversational_rag_chain.stream(
-            {
-                "input": text,
-                "dietary_preferences": dietary_preferences,
-                "nutritional_goals": nutritional_goals,
-                "user_specific_conditions": user_specific_conditions
-            },
+            {"input": text, **prompt_variables},
             config={
-                "configurable": {"session_id": "abc123"}
+                "configurable": {
+                    "session_id": session_id,
+                    # restrict retrieval to chunks compatible with the profile
+                    "search_kwargs": self.retriever.search_kwargs_for(profile),
+                }
             },
         ):
             if 'answer' in chunk.keys():
+                chunks.append(chunk.get("answer"))
                 yield chunk.get("answer")
             else:
                 continue
-        print(self.store["abc123"])
\ No newline at end of file
+        if cacheable:
+            self.response_cache.store(text, fingerprint, chunks)
+        print(self.store.get(session_id))
+
+    async def achat_stream(self, text: str, session_id: str, profile: UserProfile = None) -> AsyncGenerator[str, None]:
+        """
+        Async chat_stream: the query embedding, rewrite and generation calls are
+        awaited on the shared event loop (see async_bridge.get_loop); local
+        search and reranking run in its executor. Takes the profile explicitly
+        since it does not run on the Streamlit script thread.
+        """
+        print("Chatting with Jeeves (async)")
+        prompt_variables = profile.prompt_variables() if profile else EMPTY_PROMPT_VARIABLES
+
+        # history reads and writes can hit SQLite, keep them off the event loop
+        history = await asyncio.to_thread(self.store.get, session_id)
+        cacheable = self.response_cache is not None and not await history.aget_messages()
+        if cacheable:
+            fingerprint = profile.fingerprint() if profile else ""
+            cached = await asyncio.to_thread(self.response_cache.lookup, text, fingerprint)
+            if cached is not None:
+                print("Serving cached response")
+                await history.aadd_messages([HumanMessage(content=text), AIMessage(content="".join(cached))])
+                for chunk in cached:
+                    yield chunk
+                return
+
+        chunks = []
+        async for chunk in self.conversational_rag_chain.astream(
+            {"input": text, **prompt_variables},
+            config={
+                "configurable": {
+                    "session_id": session_id,
+                    "search_kwargs": self.retriever.search_kwargs_for(profile),
+                }
+            },
+        ):
+            if 'answer' in chunk.keys():
+                chunks.append(chunk.get("answer"))
+                yield chunk.get("answer")
+        if cacheable:
+            await asyncio.to_thread(self.response_cache.store, text, fingerprint, chunks)
+
+@st.cache_resource(show_spinner=False)
+def get_bot() -> LMMentorBot:
+    """
+    Process-wide LMMentorBot shared by every Streamlit session
+    """
+    return LMMentorBot()
@@ -0,0 +1,178 @@
+import re
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import mmh3
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from token_counter import count_tokens, get_encoding
+
+# MinHash permutations are (a * h + b) mod a Mersenne prime; with 32-bit
+# mmh3 hashes and a < 2**31, a * h + b stays inside uint64
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_MULTIPLIER = (1 << 31) - 1
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles. Each shingle is hashed once with
+    mmh3 and the num_perm permutations are applied with numpy.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.shingle_size = shingle_size
+        self.a = rng.integers(1, MAX_MULTIPLIER, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MAX_MULTIPLIER, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower())
+        n = self.shingle_size
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter((mmh3.hash(s, signed=False) for s in shingles), dtype=np.uint64, count=len(shingles))
+        permuted = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    @staticmethod
+    def similarity(left: np.ndarray, right: np.ndarray) -> float:
+        """
+        Estimated Jaccard similarity of the two shingle sets
+        """
+        return float(np.mean(left == right))
+
+
+def _position(doc: Document) -> Tuple:
+    """
+    The unit a chunk was split from (source file, page or JSONL line)
+    """
+    metadata = doc.metadata
+    return metadata.get("source"), metadata.get("page", metadata.get("line"))
+
+
+def _suffix_prefix_overlap(left: str, right: str, max_overlap: int = 1000) -> int:
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_pair(left: Document, right: Document) -> Optional[Document]:
+    """
+    Join two chunks of the same unit when right starts inside or straight
+    after left, dropping the overlap the splitter repeated
+    """
+    if _position(left) != _position(right) or left.metadata.get("source") is None:
+        return None
+    start, next_start = left.metadata.get("start_index"), right.metadata.get("start_index")
+    if start is not None and next_start is not None:
+        end = start + len(left.page_content)
+        if not start <= next_start <= end:
+            return None
+        text = left.page_content + right.page_content[end - next_start:]
+    else:
+        index, next_index = left.metadata.get("chunk_index"), right.metadata.get("chunk_index")
+        if index is None or next_index != index + 1:
+            return None
+        overlap = _suffix_prefix_overlap(left.page_content, right.page_content)
+        text = left.page_content + ("" if overlap else "\n") + right.page_content[overlap:]
+        # so a third neighbour can still attach to the merged passage
+        return Document(page_content=text, metadata=dict(left.metadata, chunk_index=next_index))
+    return Document(page_content=text, metadata=dict(left.metadata))
+
+
+def _order_key(doc: Document) -> Tuple:
+    metadata = doc.metadata
+    return metadata.get("start_index", -1), metadata.get("chunk_index", -1)
+
+
+class ContextPacker:
+    """
+    Turns the retrieved chunks into the context handed to the stuff-documents
+    chain: near-duplicates are dropped (MinHash over word shingles),
+    neighbouring chunks of the same source are merged into one passage, and
+    the result is cut to max_tokens. Relevance order is kept; a merged
+    passage takes the place of its best-ranked piece.
+    """
+
+    def __init__(self, max_tokens: int = 2000, dedup_threshold: float = 0.8, merge_adjacent: bool = True,
+                 num_perm: int = 64, shingle_size: int = 5, min_tail_tokens: int = 50):
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.merge_adjacent = merge_adjacent
+        self.min_tail_tokens = min_tail_tokens
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "tokens_in": 0, "tokens_out": 0, "duplicates": 0, "merged": 0, "truncated": 0}
+
+    def _dedup(self, docs: Sequence[Document]) -> List[Document]:
+        kept, signatures = [], []
+        for doc in docs:
+            signature = self.hasher.signature(doc.page_content)
+            if any(self.hasher.similarity(signature, other) >= self.dedup_threshold for other in signatures):
+                continue
+            kept.append(doc)
+            signatures.append(signature)
+        return kept
+
+    def _merge(self, docs: Sequence[Document]) -> List[Document]:
+        # group by unit in rank order, then merge runs of neighbours within each group
+        groups = {}
+        for rank, doc in enumerate(docs):
+            groups.setdefault(_position(doc), []).append((rank, doc))
+
+        passages = []
+        for members in groups.values():
+            members.sort(key=lambda item: _order_key(item[1]))
+            rank, current = members[0]
+            for next_rank, doc in members[1:]:
+                merged = _merge_pair(current, doc)
+                if merged is None:
+                    passages.append((rank, current))
+                    rank, current = next_rank, doc
+                else:
+                    rank, current = min(rank, next_rank), merged
+            passages.append((rank, current))
+        passages.sort(key=lambda item: item[0])
+        return [doc for _, doc in passages]
+
+    def _trim(self, docs: Sequence[Document]) -> Tuple[List[Document], int]:
+        kept, total = [], 0
+        for doc in docs:
+            tokens = count_tokens(doc.page_content)
+            remaining = self.max_tokens - total
+            if tokens <= remaining:
+                kept.append(doc)
+                total += tokens
+                continue
+            if remaining >= self.min_tail_tokens:
+                encoding = get_encoding()
+                text = encoding.decode(encoding.encode(doc.page_content, disallowed_special=())[:remaining])
+                kept.append(Document(page_content=text, metadata=dict(doc.metadata, truncated=True)))
+                total += remaining
+            break
+        return kept, total
+
+    def pack(self, docs: Sequence[Document]) -> List[Document]:
+        tokens_in = sum(count_tokens(doc.page_content) for doc in docs)
+        deduped = self._dedup(docs)
+        merged = self._merge(deduped) if self.merge_adjacent else deduped
+        packed, tokens_out = self._trim(merged)
+
+        duplicates = len(docs) - len(deduped)
+        merges = len(deduped) - len(merged)
+        truncated = len(merged) - len(packed) + sum(1 for doc in packed if doc.metadata.get("truncated"))
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["tokens_in"] += tokens_in
+            self.stats["tokens_out"] += tokens_out
+            self.stats["duplicates"] += duplicates
+            self.stats["merged"] += merges
+            self.stats["truncated"] += truncated
+        print(f"Context packed: {len(docs)} chunks -> {len(packed)} passages, {tokens_in} -> {tokens_out} tokens "
+              f"({tokens_in - tokens_out} removed; {duplicates} duplicates, {merges} merges, {truncated} cut)")
+        return packed
+
+    def as_runnable(self) -> RunnableLambda:
+        return RunnableLambda(self.pack, name="pack_context")
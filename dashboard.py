@@ -1,15 +1,17 @@
 import os
 import streamlit as st
-from chat_responses import LMMentorBot
+from chat_responses import get_bot
+from async_bridge import iterate_in_loop
 from audit_parse import extract_text_fromaudit
-from feedback import append_values, log_interaction, log_feedback
+from audit_cache import get_audit_cache
+from feedback import log_interaction, log_feedback
 import asyncio
 from typing import AsyncGenerator
-import toml
+from app_config import get_config
+from user_profile import UserProfile
 
-# Load secrets
-secrets = toml.load(".streamlit/secrets.toml")
-ALLOWED_USERS = secrets["auth"]["allowed_users"].split(",")
+# Parsed once per process and hot-reloaded when secrets.toml changes
+ALLOWED_USERS = get_config().allowed_users
 
 def check_auth():
     """Simple email-based authentication"""
@@ -56,8 +58,20 @@ with st.sidebar:
     
     if uploaded_file is not None:
         try:
-            # Extract text from PDF
-            pdf_text = extract_text_fromaudit(uploaded_file)
+            # Extract text from PDF, reruns and repeat uploads hit the cache
+            audit_cache = get_audit_cache()
+            pdf_digest = audit_cache.digest(uploaded_file.getvalue())
+            cached_audit = audit_cache.get(pdf_digest) or {}
+            pdf_text = cached_audit.get("text")
+            if pdf_text is None:
+                # [audit] section in secrets: extract_workers, timing_report
+                audit_config = st.secrets.get("audit", {})
+                pdf_text = extract_text_fromaudit(
+                    uploaded_file,
+                    workers=audit_config.get("extract_workers"),
+                    timing_report=audit_config.get("timing_report", False),
+                )
+                audit_cache.put(pdf_digest, text=pdf_text)
             if pdf_text != "Invalid PDF":
                 # Store PDF context in session state
                 st.session_state["pdf_context"] = pdf_text
@@ -103,20 +117,18 @@ with st.sidebar:
         submitted = st.form_submit_button("Update Information")
         
         if submitted:
-            # Create a context string from the form data
-            context = f"""
-            User Profile:
-            - Age: {age}
-            - Gender: {gender}
-            - Weight: {weight} lbs
-            - Height: {height} inches
-            - Dietary Restrictions: {', '.join(dietary_restrictions)}
-            - Allergies: {allergies}
-            - Health Conditions: {health_conditions}
-            - Primary Goal: {primary_goal}
-            - Activity Level: {activity_level}
-            """
-            st.session_state.user_context = context
+            # Build the profile once; it is rendered into the prompt variables per turn
+            st.session_state.user_profile = UserProfile(
+                age=age,
+                gender=gender,
+                weight=weight,
+                height=height,
+                dietary_restrictions=tuple(dietary_restrictions),
+                allergies=allergies,
+                health_conditions=health_conditions,
+                primary_goal=primary_goal,
+                activity_level=activity_level,
+            )
             st.success("Information updated successfully!")
 
     st.divider()
@@ -133,19 +145,29 @@ with st.sidebar:
     if st.button("Logout"):
         st.session_state.user_email = None
         st.session_state.user_info = None
+        # the next user of this browser tab gets their own session and history
+        st.session_state.pop("session_id", None)
+        st.session_state.pop("messages", None)
         st.rerun()
 
-# Initialize chat bot
+# Initialize chat bot (shared across sessions) and this session's history key
 if "chatBot" not in st.session_state:
-    st.session_state.chatBot = LMMentorBot()
+    st.session_state.chatBot = get_bot()
 
-# Initialize user context
-if "user_context" not in st.session_state:
-    st.session_state.user_context = ""
+if "session_id" not in st.session_state:
+    # stable per user with [history] sqlite_path, so a persisted history is re-attached
+    st.session_state.session_id = st.session_state.chatBot.store.session_id_for(st.session_state.user_email)
 
-# Initialize chat history
+# Initialize user profile
+if "user_profile" not in st.session_state:
+    st.session_state.user_profile = None
+
+# Initialize chat history, from the stored one when it was persisted
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = [
+        {"role": "user" if m.type == "human" else "assistant", "content": m.content}
+        for m in st.session_state.chatBot.store.get(st.session_state.session_id).messages
+    ]
 
 # Display chat messages from history
 for message in st.session_state.messages:
@@ -171,9 +193,14 @@ def send_user_input(prompt:str):
     # call response generator with user context
     with st.chat_message("assistant", avatar="🥑"):
         with st.spinner("Thinking..."):
-            # Combine user context with prompt
-            full_prompt = f"{st.session_state.user_context}\n\nUser: {prompt}"
-            response = st.write_stream(st.session_state.chatBot.chat_stream(full_prompt))
+            # the profile goes in through the prompt variables, not the message text
+            if st.secrets.get("chat", {}).get("async_stream", True):
+                stream = iterate_in_loop(st.session_state.chatBot.achat_stream(
+                    prompt, st.session_state.session_id, st.session_state.user_profile))
+            else:
+                stream = st.session_state.chatBot.chat_stream(
+                    prompt, st.session_state.session_id, st.session_state.user_profile)
+            response = st.write_stream(stream)
 
     st.session_state.messages.append({"role": "assistant", "content": response})
     
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with an in-memory LRU and an optional SQLite
+    tier, keyed by a hash of model + input type + text. Queries are
+    whitespace-normalized so near-identical rewrites share an entry.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, max_entries: int = 4096, sqlite_path: Optional[str] = None):
+        self.underlying = underlying
+        self.model = model
+        self.max_entries = max_entries
+        self.sqlite_path = sqlite_path
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        if sqlite_path:
+            with sqlite3.connect(sqlite_path, timeout=30) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{kind}\x00{text}".encode()).hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def _remember(self, key: str, vector: List[float]):
+        # caller holds self._lock
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _get_many(self, keys: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            self.stats["memory_hits"] += len(found)
+
+        missing = [k for k in keys if k not in found]
+        if self.sqlite_path and missing:
+            rows = []
+            with sqlite3.connect(self.sqlite_path, timeout=30) as conn:
+                # stay under SQLite's bound-parameter limit
+                for i in range(0, len(missing), 500):
+                    batch = missing[i:i + 500]
+                    rows += conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch,
+                    ).fetchall()
+            with self._lock:
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+                self.stats["disk_hits"] += len(rows)
+        return found
+
+    def _put_many(self, items: dict):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+        if self.sqlite_path:
+            with sqlite3.connect(self.sqlite_path, timeout=30) as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()],
+                )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("document", t) for t in texts]
+        found = self._get_many(list(dict.fromkeys(keys)))
+
+        # embed each missing text once, in a single batch
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}
+        if missing:
+            with self._lock:
+                self.stats["misses"] += len(missing)
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            self._put_many(new)
+            found.update(new)
+        return [found[k] for k in keys]
+
+    def _query_key(self, text: str) -> str:
+        return self._key("query", re.sub(r"\s+", " ", text.strip()))
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._query_key(text)
+        found = self._get_many([key])
+        if key in found:
+            return found[key]
+        with self._lock:
+            self.stats["misses"] += 1
+        vector = self.underlying.embed_query(text)
+        self._put_many({key: vector})
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        embed_query for the async chain: a miss awaits the model's own async
+        client (VoyageAIEmbeddings uses voyageai.AsyncClient), only the SQLite
+        tier goes to a thread
+        """
+        key = self._query_key(text)
+        found = await asyncio.to_thread(self._get_many, [key]) if self.sqlite_path else self._get_many([key])
+        if key in found:
+            return found[key]
+        with self._lock:
+            self.stats["misses"] += 1
+        vector = await self.underlying.aembed_query(text)
+        if self.sqlite_path:
+            await asyncio.to_thread(self._put_many, {key: vector})
+        else:
+            self._put_many({key: vector})
+        return vector
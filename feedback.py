@@ -1,10 +1,19 @@
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from google.auth.exceptions import TransportError
 from google.oauth2 import service_account
+import httplib2
+import atexit
 import json
+import os
+import queue
 import streamlit as st
+import threading
 import time
 import logging
+import uuid
+from log_sinks import JSONLSink, LogSink, SQLiteSink
+from app_config import get_config
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -12,18 +21,28 @@ logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
+# connection failures and timeouts, worth retrying like a 429 or 5xx
+NETWORK_ERRORS = (OSError, httplib2.HttpLib2Error, TransportError)
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed append may succeed if retried as is."""
+    if isinstance(error, HttpError):
+        return error.resp.status == 429 or error.resp.status >= 500
+    return isinstance(error, NETWORK_ERRORS)
+
 class FeedbackManager:
-    def __init__(self):
+    def __init__(self, sinks: list = None):
         self.feedback_history = []
+        self.sinks = sinks
 
     def add_feedback(self, sentiment: str, messages: list):
-        """Add feedback to the history and log it to Google Sheets."""
+        """Add feedback to the history and log it to the configured sinks."""
         self.feedback_history.append({
             "sentiment": sentiment,
             "messages": messages,
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
         })
-        log_feedback(sentiment, messages)
+        log_feedback(sentiment, messages, sinks=self.sinks)
 
     def get_feedback_history(self):
         """Get the feedback history."""
@@ -32,39 +51,34 @@ class FeedbackManager:
 def get_sheet_config(email: str):
     """Get the appropriate spreadsheet configuration based on user email."""
     try:
-        # Get all allowed users from secrets
-        allowed_users = st.secrets["auth"]["allowed_users"].split(",")
-        
-        # Find the matching user configuration
-        for user in allowed_users:
-            if user.strip().lower() == email.lower():
-                return {
-                    "spreadsheet_id": st.secrets["google_sheets"]["mike_spreadsheet_id"],
-                    "sheet_name": st.secrets["google_sheets"]["mike_sheet_name"]
-                }
-        
-        # If no specific configuration found, use default
-        return {
-            "spreadsheet_id": st.secrets["google_sheets"]["mike_spreadsheet_id"],
-            "sheet_name": st.secrets["google_sheets"]["mike_sheet_name"]
-        }
+        return get_config().sheet_for(email)
     except Exception as e:
         logger.error(f"Error getting sheet config: {e}")
         return None
 
+_sheets_service = None
+_sheets_service_lock = threading.Lock()
+
+def get_sheets_service():
+    """Build the Sheets service once per process and reuse it."""
+    global _sheets_service
+    with _sheets_service_lock:
+        if _sheets_service is None:
+            # Parse the service account credentials from secrets
+            credentials_dict = json.loads(st.secrets["api_keys"]["GOOGLE_CREDENTIALS"])
+            credentials = service_account.Credentials.from_service_account_info(
+                credentials_dict,
+                scopes=SCOPES
+            )
+            _sheets_service = build("sheets", "v4", credentials=credentials, cache_discovery=False)
+            logger.info("Successfully built Google Sheets service")
+    return _sheets_service
+
 def append_values(spreadsheet_id, range_name, value_input_option, _values):
     try:
         logger.info("Starting Google Sheets append operation...")
         
-        # Parse the service account credentials from secrets
-        credentials_dict = json.loads(st.secrets["api_keys"]["GOOGLE_CREDENTIALS"])
-        credentials = service_account.Credentials.from_service_account_info(
-            credentials_dict,
-            scopes=SCOPES
-        )
-
-        service = build("sheets", "v4", credentials=credentials)
-        logger.info("Successfully built Google Sheets service")
+        service = get_sheets_service()
 
         body = {"values": _values}
         result = (
@@ -87,76 +101,269 @@ def append_values(spreadsheet_id, range_name, value_input_option, _values):
         logger.error(f"Unexpected error in append_values: {e}")
         raise e
 
-def log_interaction(prompt: str, response: str, interaction_type: str = "Chat Interaction", feedback_status: str = "Pending Feedback"):
-    """Log an interaction to the appropriate Google Sheet based on the user's email."""
-    try:
-        if not st.session_state.get("user_info"):
-            logger.warning("No user_info found in session state")
-            return
+class SheetsLogWriter:
+    """
+    Background writer for Sheets rows. Rows are first appended to a local
+    spool file, then coalesced per (spreadsheet, range) into one append call
+    when batch_size rows are waiting or flush_interval seconds have passed.
+    Rate limits, server and network errors are retried with exponential
+    backoff, for at most max_rounds batches per row; rows stay in the spool
+    until they are written, and a restart replays whatever is left. Rows rejected for good (any other 4xx, e.g. a
+    bad range or a sheet the service account cannot edit) are moved to
+    failed_path instead, so they don't block their range forever.
 
-        email = st.session_state["user_info"].get("email")
-        if not email:
-            logger.warning("No email found in user_info")
+    Only the worker thread talks to Sheets (the service's httplib2 transport
+    is not thread-safe); flush() stops and joins it before draining.
+    """
+
+    def __init__(self, spool_path: str = ".cache/sheets_spool.jsonl", batch_size: int = 50,
+                 flush_interval: float = 5.0, max_retries: int = 5, backoff_base: float = 1.0,
+                 failed_path: str = ".cache/sheets_failed.jsonl", max_rounds: int = 5,
+                 stop_timeout: float = 30.0):
+        self.spool_path = spool_path
+        self.failed_path = failed_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_rounds = max_rounds
+        self.stop_timeout = stop_timeout
+        self._queue = queue.Queue()
+        self._pending = {}
+        # entry id -> batches it failed in since this process started
+        self._rounds = {}
+        self._stop = threading.Event()
+        self._spool_lock = threading.Lock()
+        os.makedirs(os.path.dirname(spool_path) or ".", exist_ok=True)
+        for entry in self._read_spool():
+            self._pending[entry["id"]] = entry
+            self._queue.put(entry)
+        if self._pending:
+            logger.info(f"Replaying {len(self._pending)} spooled log rows")
+        self._thread = threading.Thread(target=self._run, name="sheets-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _read_spool(self):
+        if not os.path.exists(self.spool_path):
+            return []
+        entries = []
+        with open(self.spool_path, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping corrupt spool line")
+        return entries
+
+    def _rewrite_spool(self):
+        # caller holds self._spool_lock
+        tmp_path = self.spool_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for entry in self._pending.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.spool_path)
+
+    def enqueue(self, spreadsheet_id, range_name, value_input_option, values):
+        entry = {
+            "id": uuid.uuid4().hex,
+            "spreadsheet_id": spreadsheet_id,
+            "range": range_name,
+            "value_input_option": value_input_option,
+            "values": values,
+        }
+        with self._spool_lock:
+            with open(self.spool_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._pending[entry["id"]] = entry
+        self._queue.put(entry)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=1.0)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while sum(len(e["values"]) for e in batch) < self.batch_size and not self._stop.is_set():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        groups = {}
+        for entry in batch:
+            key = (entry["spreadsheet_id"], entry["range"], entry["value_input_option"])
+            groups.setdefault(key, []).append(entry)
+
+        for (spreadsheet_id, range_name, value_input_option), entries in groups.items():
+            rows = [row for entry in entries for row in entry["values"]]
+            error = None
+            for attempt in range(self.max_retries):
+                try:
+                    append_values(spreadsheet_id, range_name, value_input_option, rows)
+                    error = None
+                    break
+                except Exception as e:
+                    error = e
+                    if not is_transient(e) or attempt == self.max_retries - 1:
+                        break
+                    delay = self.backoff_base * (2 ** attempt)
+                    logger.warning(f"Batched append of {len(rows)} rows failed ({e}), retrying in {delay:.0f}s")
+                    time.sleep(delay)
+
+            if error is not None and is_transient(error):
+                # leave the rows spooled and try again with a later batch, up
+                # to max_rounds; after that they wait in the spool for a restart
+                parked = 0
+                for entry in entries:
+                    self._rounds[entry["id"]] = self._rounds.get(entry["id"], 0) + 1
+                    if self._rounds[entry["id"]] < self.max_rounds:
+                        self._queue.put(entry)
+                    else:
+                        parked += 1
+                logger.error(f"Giving up on {len(rows)} rows for now, they stay in the spool"
+                             + (f" ({parked} until the next restart)" if parked else ""))
+                continue
+
+            with self._spool_lock:
+                if error is not None:
+                    logger.error(f"Sheets rejected {len(rows)} rows ({error}), moving them to {self.failed_path}")
+                    os.makedirs(os.path.dirname(self.failed_path) or ".", exist_ok=True)
+                    with open(self.failed_path, "a") as f:
+                        for entry in entries:
+                            f.write(json.dumps(dict(entry, error=str(error))) + "\n")
+                for entry in entries:
+                    self._pending.pop(entry["id"], None)
+                    self._rounds.pop(entry["id"], None)
+                self._rewrite_spool()
+
+    def flush(self):
+        """Stop the worker and write everything still queued, used at shutdown."""
+        self._stop.set()
+        self._thread.join(self.stop_timeout)
+        if self._thread.is_alive():
+            # still inside a write; what is left stays spooled for the next start
+            logger.warning("Sheets log writer did not stop in time, queued rows stay in the spool")
             return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def get_log_writer() -> SheetsLogWriter:
+    """Process-wide SheetsLogWriter, configured by the [logging] section in secrets."""
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None:
+            _log_writer = SheetsLogWriter(**dict(st.secrets.get("logging", {})))
+    return _log_writer
+
+class SheetsSink(LogSink):
+    """Google Sheets as a downstream exporter, written through the batched SheetsLogWriter."""
 
-        sheet_config = get_sheet_config(email)
+    def write(self, record: dict):
+        sheet_config = get_sheet_config(record["email"])
         if not sheet_config:
             logger.error("Failed to get sheet configuration")
             return
-        
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        values = [[
-            timestamp,
-            email,
-            interaction_type,
-            prompt,
-            response,
-            feedback_status
-        ]]
-        
-        append_values(
-            sheet_config["spreadsheet_id"],
-            f"{sheet_config['sheet_name']}!A:F",
-            "USER_ENTERED",
-            values
-        )
-        logger.info("Successfully logged interaction")
-    except Exception as e:
-        logger.error(f"Failed to log interaction: {e}")
 
-def log_feedback(sentiment: str, messages: list):
-    """Log feedback to the appropriate Google Sheet based on the user's email."""
+        if record["event"] == "Feedback":
+            range_name = f"{sheet_config['sheet_name']}!A:E"
+            values = [[record["timestamp"], record["email"], "Feedback", record["sentiment"], str(record["messages"])]]
+        else:
+            range_name = f"{sheet_config['sheet_name']}!A:F"
+            values = [[record["timestamp"], record["email"], record["event"], record["prompt"],
+                       record["response"], record["feedback_status"]]]
+        get_log_writer().enqueue(sheet_config["spreadsheet_id"], range_name, "USER_ENTERED", values)
+
+_sinks = None
+_sinks_lock = threading.Lock()
+
+def get_sinks() -> list:
+    """
+    Process-wide logging sinks from the [log_sinks] section in secrets:
+    sinks (any of "sqlite", "jsonl", "sheets"), sqlite_path, jsonl_path.
+    """
+    global _sinks
+    with _sinks_lock:
+        if _sinks is None:
+            config = dict(st.secrets.get("log_sinks", {}))
+            _sinks = []
+            for name in config.get("sinks", ["sqlite", "sheets"]):
+                if name == "sqlite":
+                    _sinks.append(SQLiteSink(config.get("sqlite_path", "logs/events.db")))
+                elif name == "jsonl":
+                    _sinks.append(JSONLSink(config.get("jsonl_path", "logs/events.jsonl")))
+                elif name == "sheets":
+                    _sinks.append(SheetsSink())
+                else:
+                    logger.error(f"Unknown log sink: {name}")
+    return _sinks
+
+def _current_email():
+    if not st.session_state.get("user_info"):
+        logger.warning("No user_info found in session state")
+        return None
+
+    email = st.session_state["user_info"].get("email")
+    if not email:
+        logger.warning("No email found in user_info")
+        return None
+    return email
+
+def _write_record(record: dict, sinks: list = None):
+    for sink in sinks if sinks is not None else get_sinks():
+        try:
+            sink.write(record)
+        except Exception as e:
+            logger.error(f"{type(sink).__name__} failed to write {record['event']} event: {e}")
+
+def log_interaction(prompt: str, response: str, interaction_type: str = "Chat Interaction", feedback_status: str = "Pending Feedback", sinks: list = None):
+    """Log an interaction to the configured sinks."""
     try:
-        if not st.session_state.get("user_info"):
-            logger.warning("No user_info found in session state")
+        email = _current_email()
+        if not email:
             return
 
-        email = st.session_state["user_info"].get("email")
+        _write_record({
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "email": email,
+            "event": interaction_type,
+            "prompt": prompt,
+            "response": response,
+            "feedback_status": feedback_status,
+        }, sinks)
+        logger.info("Logged interaction")
+    except Exception as e:
+        logger.error(f"Failed to log interaction: {e}")
+
+def log_feedback(sentiment: str, messages: list, sinks: list = None):
+    """Log feedback to the configured sinks."""
+    try:
+        email = _current_email()
         if not email:
-            logger.warning("No email found in user_info")
             return
 
-        sheet_config = get_sheet_config(email)
-        if not sheet_config:
-            logger.error("Failed to get sheet configuration")
-            return
-        
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        values = [[
-            timestamp,
-            email,
-            "Feedback",
-            sentiment,
-            str(messages)
-        ]]
-        
-        append_values(
-            sheet_config["spreadsheet_id"],
-            f"{sheet_config['sheet_name']}!A:E",
-            "USER_ENTERED",
-            values
-        )
-        logger.info("Successfully logged feedback")
+        _write_record({
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "email": email,
+            "event": "Feedback",
+            "sentiment": sentiment,
+            "messages": messages,
+        }, sinks)
+        logger.info("Logged feedback")
     except Exception as e:
         logger.error(f"Failed to log feedback: {e}")
-
@@ -0,0 +1,158 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from token_counter import count_message_tokens, message_text
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+summary_template = ChatPromptTemplate.from_messages(
+    [
+        ("system",
+         "Condense the conversation below into a short running summary for a health and nutrition assistant. "
+         "Keep the user's stated preferences, goals, health conditions, allergies, foods eaten and any open "
+         "follow-ups. Plain text, no preamble."),
+        ("human", "Previous summary:\n{summary}"),
+        MessagesPlaceholder("messages"),
+    ]
+)
+
+
+def _message_key(messages: List[BaseMessage], i: int) -> str:
+    """
+    Identifies messages[i] by its own text and its predecessor's, so the
+    message a summary stops at can be found again after the history store
+    has trimmed older messages off the front
+    """
+    digest = hashlib.sha256()
+    for m in messages[max(0, i - 1):i + 1]:
+        digest.update(m.type.encode())
+        digest.update(message_text(m).encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class HistoryCompactor:
+    """
+    Keeps the last keep_turns turns of chat_history verbatim (within max_tokens)
+    and folds everything older into a running summary per session.
+
+    Summaries are built in the background, so compaction never puts an extra
+    LLM call in front of a reply. Each session's summary remembers the last
+    message it covers; messages between that one and the verbatim window are
+    folded in by the next background run and are left out of the prompt until
+    then, so chat_history stays within budget even before a summary exists
+    and after the history store has started dropping the oldest messages.
+    """
+
+    def __init__(self, llm: BaseChatModel, keep_turns: int = 4, max_tokens: int = 1500, cache_size: int = 1024):
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+        self.cache_size = cache_size
+        self.summary_chain = summary_template | llm | StrOutputParser()
+        # session_id -> (summary, key of the last message it covers)
+        self._summaries: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+        self.stats = {"turns": 0, "tokens_in": 0, "tokens_out": 0, "tokens_saved": 0}
+
+    def _split(self, messages: List[BaseMessage]) -> int:
+        """
+        Index where the verbatim window starts
+        """
+        start = max(0, len(messages) - 2 * self.keep_turns)
+        while start < len(messages) and count_message_tokens(messages[start:]) > self.max_tokens:
+            start += 1
+        return start
+
+    def _session_summary(self, session_id: str) -> Tuple[Optional[str], Optional[str]]:
+        with self._lock:
+            if session_id not in self._summaries:
+                return None, None
+            self._summaries.move_to_end(session_id)
+            return self._summaries[session_id]
+
+    @staticmethod
+    def _covered(older: List[BaseMessage], last_key: Optional[str]) -> int:
+        """
+        How many of the older messages the session summary already covers.
+        When its last message is no longer in the history it was trimmed off
+        the front, and everything still there is newer than the summary.
+        """
+        if last_key is None:
+            return 0
+        for i in range(len(older) - 1, -1, -1):
+            if _message_key(older, i) == last_key:
+                return i + 1
+        return 0
+
+    def _summarize(self, session_id: str, previous: Optional[str], messages: List[BaseMessage], last_key: str):
+        try:
+            summary = self.summary_chain.invoke({"summary": previous or "(none)", "messages": messages})
+            with self._lock:
+                self._summaries[session_id] = (summary, last_key)
+                self._summaries.move_to_end(session_id)
+                while len(self._summaries) > self.cache_size:
+                    self._summaries.popitem(last=False)
+        except Exception as e:
+            print(f"History summarization failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
+
+    def _schedule(self, session_id: str, previous: Optional[str], messages: List[BaseMessage], last_key: str):
+        with self._lock:
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+        self._executor.submit(self._summarize, session_id, previous, messages, last_key)
+
+    def compact(self, messages: List[BaseMessage], session_id: str = "") -> List[BaseMessage]:
+        messages = list(messages)
+        split = self._split(messages)
+        summary, last_key = self._session_summary(session_id)
+        if split > 0:
+            older = messages[:split]
+            covered = self._covered(older, last_key)
+            if covered < len(older):
+                # roll the summary forward over the messages it does not cover yet
+                self._schedule(session_id, summary, older[covered:], _message_key(older, len(older) - 1))
+        compacted = messages[split:]
+        if summary:
+            compacted = [SystemMessage(content=SUMMARY_PREFIX + summary)] + compacted
+        self._record(messages, compacted)
+        return compacted
+
+    def _record(self, original: List[BaseMessage], compacted: List[BaseMessage]):
+        tokens_in = count_message_tokens(original)
+        tokens_out = count_message_tokens(compacted)
+        with self._lock:
+            self.stats["turns"] += 1
+            self.stats["tokens_in"] += tokens_in
+            self.stats["tokens_out"] += tokens_out
+            self.stats["tokens_saved"] += tokens_in - tokens_out
+        print(f"chat_history compacted: {tokens_in} -> {tokens_out} tokens (saved {tokens_in - tokens_out})")
+
+    def as_runnable(self) -> RunnableLambda:
+        """
+        Runnable mapping the chain input to a compacted chat_history, for use in
+        RunnablePassthrough.assign(chat_history=...)
+        """
+        def compact(x: dict, config: RunnableConfig) -> List[BaseMessage]:
+            session_id = config.get("configurable", {}).get("session_id", "")
+            return self.compact(x.get("chat_history", []), session_id)
+
+        async def acompact(x: dict, config: RunnableConfig) -> List[BaseMessage]:
+            # only token counting, cheaper inline than a hop to the executor
+            return compact(x, config)
+
+        return RunnableLambda(compact, afunc=acompact, name="compact_history")
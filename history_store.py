@@ -0,0 +1,208 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, messages_from_dict, messages_to_dict
+
+from token_counter import count_message_tokens
+
+
+def trim_messages_to_cap(messages: List[BaseMessage], max_messages: int, max_tokens: int) -> List[BaseMessage]:
+    """
+    Drop the oldest messages until the history fits both caps.
+    A history never starts with an AI reply that lost its question.
+    """
+    messages = list(messages)
+    while messages and (len(messages) > max_messages or count_message_tokens(messages) > max_tokens):
+        messages.pop(0)
+    while messages and isinstance(messages[0], AIMessage):
+        messages.pop(0)
+    return messages
+
+
+class BoundedChatMessageHistory(BaseChatMessageHistory):
+    """
+    In-memory chat history capped by message count and token count
+    """
+
+    def __init__(self, max_messages: int, max_tokens: int):
+        self.messages: List[BaseMessage] = []
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            self.messages = trim_messages_to_cap(
+                self.messages + list(messages), self.max_messages, self.max_tokens
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self.messages = []
+
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat history kept in SQLite so it survives restarts without living in RAM.
+    Only the session id is held in memory; messages are read on access.
+    """
+
+    def __init__(self, session_id: str, db_path: str, max_messages: int, max_tokens: int):
+        self.session_id = session_id
+        self.db_path = db_path
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT message FROM chat_messages WHERE session_id = ? ORDER BY id",
+                (self.session_id,),
+            ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, message) VALUES (?, ?)",
+                [(self.session_id, json.dumps(m)) for m in messages_to_dict(list(messages))],
+            )
+            conn.execute(
+                "INSERT INTO chat_sessions (session_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (self.session_id, now),
+            )
+            rows = conn.execute(
+                "SELECT id, message FROM chat_messages WHERE session_id = ? ORDER BY id",
+                (self.session_id,),
+            ).fetchall()
+            stored = messages_from_dict([json.loads(row[1]) for row in rows])
+            kept = trim_messages_to_cap(stored, self.max_messages, self.max_tokens)
+            dropped = len(stored) - len(kept)
+            if dropped:
+                conn.executemany(
+                    "DELETE FROM chat_messages WHERE id = ?",
+                    [(row[0],) for row in rows[:dropped]],
+                )
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (self.session_id,))
+            conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (self.session_id,))
+
+
+class SessionHistoryStore:
+    """
+    Session-keyed chat histories with LRU + TTL eviction.
+
+    max_sessions bounds how many histories are held at once, ttl_seconds drops
+    sessions idle for longer than that, and every history is capped at
+    max_messages / max_tokens. With sqlite_path set, histories are stored on
+    disk and the LRU only holds lightweight handles; use session_id_for so a
+    signed-in user gets the same session (and history) back after a restart.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 500,
+        ttl_seconds: float = 6 * 60 * 60,
+        max_messages: int = 40,
+        max_tokens: int = 8000,
+        sqlite_path: Optional[str] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.sqlite_path = sqlite_path
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        if sqlite_path:
+            self._init_db()
+            self._purge_disk(time.time())
+
+    def _init_db(self):
+        with sqlite3.connect(self.sqlite_path, timeout=30) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, message TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions (session_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+            )
+
+    def _new_history(self, session_id: str) -> BaseChatMessageHistory:
+        if self.sqlite_path:
+            return SQLiteChatMessageHistory(session_id, self.sqlite_path, self.max_messages, self.max_tokens)
+        return BoundedChatMessageHistory(self.max_messages, self.max_tokens)
+
+    def _evict(self, now: float):
+        # drop idle sessions, then least recently used ones over the limit
+        expired = [sid for sid, (_, last_used) in self._sessions.items() if now - last_used > self.ttl_seconds]
+        for sid in expired:
+            history, _ = self._sessions.pop(sid)
+            if self.sqlite_path:
+                history.clear()
+        while len(self._sessions) > self.max_sessions:
+            sid, _ = self._sessions.popitem(last=False)
+            print("Evicting chat history for session_id", sid)
+
+    def _purge_disk(self, now: float):
+        with sqlite3.connect(self.sqlite_path, timeout=30) as conn:
+            stale = conn.execute(
+                "SELECT session_id FROM chat_sessions WHERE updated_at < ?", (now - self.ttl_seconds,)
+            ).fetchall()
+            conn.executemany("DELETE FROM chat_messages WHERE session_id = ?", stale)
+            conn.executemany("DELETE FROM chat_sessions WHERE session_id = ?", stale)
+
+    def session_id_for(self, user: Optional[str] = None) -> str:
+        """
+        Session key for a new Streamlit session: stable per user when histories
+        persist to disk, so they can be re-attached, random otherwise. The
+        user's email is hashed rather than stored.
+        """
+        if self.sqlite_path and user:
+            return hashlib.sha256(f"chat-session\x00{user.strip().lower()}".encode()).hexdigest()[:32]
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> BaseChatMessageHistory:
+        now = time.time()
+        with self._lock:
+            if session_id in self._sessions:
+                history, _ = self._sessions.pop(session_id)
+            else:
+                print("Creating new chat history for session_id", session_id)
+                history = self._new_history(session_id)
+            self._sessions[session_id] = (history, now)
+            self._evict(now)
+        return history
+
+    def purge_expired(self):
+        """
+        Drop expired sessions from memory and, with the SQLite backend, from disk
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+        if self.sqlite_path:
+            self._purge_disk(now)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
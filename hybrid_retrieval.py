@@ -0,0 +1,173 @@
+import asyncio
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from metadata_filters import FilterRowCache
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase alphanumeric runs, so "EECS 281" and "eecs281"-style course
+    codes, restaurant names and nutrient terms match verbatim
+    """
+    return TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 over an inverted index of term -> (doc ids, term
+    frequencies). A query only touches the postings of its own terms.
+    """
+
+    def __init__(self, documents: Sequence[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = list(documents)
+        self.k1 = k1
+        postings: Dict[str, Tuple[list, list]] = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(self.documents), dtype=np.float32)
+        for i, doc in enumerate(self.documents):
+            counts = Counter(tokenize(doc.page_content))
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term][0].append(i)
+                postings[term][1].append(tf)
+
+        n = len(self.documents)
+        avg_length = float(lengths.mean()) if n else 1.0
+        # the length-normalised part of the BM25 denominator, per document
+        self.doc_norm = k1 * (1 - b + b * lengths / (avg_length or 1.0))
+        self.postings = {
+            term: (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            for term, (ids, tfs) in postings.items()
+        }
+        self.idf = {
+            term: math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            for term, (ids, _) in self.postings.items()
+        }
+        self.filter_rows = FilterRowCache([doc.metadata for doc in self.documents])
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 5000, **kwargs) -> "BM25Index":
+        """
+        Build from every chunk of a Chroma collection, read in pages
+        """
+        documents = []
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            for text, metadata in zip(page["documents"], page["metadatas"]):
+                documents.append(Document(page_content=text, metadata=metadata or {}))
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+        return cls(documents, **kwargs)
+
+    def search(self, query: str, k: int, where: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        """
+        Top k documents by BM25, restricted to those matching a Chroma-style
+        `where` filter when one is given
+        """
+        if not self.documents:
+            return []
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            ids, tfs = self.postings[term]
+            scores[ids] += self.idf[term] * tfs * (self.k1 + 1) / (tfs + self.doc_norm[ids])
+        if where:
+            allowed = np.zeros(len(scores), dtype=bool)
+            allowed[self.filter_rows.rows(where)] = True
+            scores[~allowed] = 0
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.documents[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Document]], rrf_k: int = 60, weights: Optional[Sequence[float]] = None
+) -> List[Tuple[Document, float]]:
+    """
+    Fuse ranked lists by summing weight / (rrf_k + rank) per document; the
+    same chunk coming back from several lists is recognised by its text
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = defaultdict(float)
+    docs: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking):
+            scores[doc.page_content] += weight / (rrf_k + rank + 1)
+            docs.setdefault(doc.page_content, doc)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [(docs[key], score) for key, score in fused]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Vector similarity and BM25 candidates (fetch_k each) fused with
+    reciprocal rank fusion; the top k fused chunks are returned. Exact term
+    matches the embedding misses get a rank of their own, so k can be lower
+    than for vector search alone. search_kwargs may carry a `filter` (Chroma
+    `where` dict) applied to both sides.
+
+    Under ainvoke/astream the query embedding is awaited on the event loop
+    and only the local vector and BM25 searches run in a thread.
+    """
+
+    vector_store: VectorStore
+    bm25: BM25Index
+    k: int = 5
+    fetch_k: int = 20
+    # vector candidates below this relevance score are dropped before fusion
+    score_threshold: Optional[float] = 0.5
+    rrf_k: int = 60
+    vector_weight: float = 1.0
+    bm25_weight: float = 1.0
+    # per-request extras, set through the "search_kwargs" ConfigurableField
+    search_kwargs: dict = {}
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_chroma(cls, vector_store, **kwargs) -> "HybridRetriever":
+        return cls(vector_store=vector_store, bm25=BM25Index.from_collection(vector_store._collection), **kwargs)
+
+    def _vector_candidates(self, embedding: List[float], where: Optional[dict]) -> List[Document]:
+        kwargs = {"filter": where} if where else {}
+        # Chroma and MmapVectorStore both return distances from this one
+        hits = self.vector_store.similarity_search_by_vector_with_relevance_scores(embedding, k=self.fetch_k, **kwargs)
+        relevance = self.vector_store._select_relevance_score_fn()
+        results = [(doc, relevance(distance)) for doc, distance in hits]
+        if self.score_threshold is not None:
+            results = [(doc, score) for doc, score in results if score >= self.score_threshold]
+        return [doc for doc, _ in results]
+
+    def _search(self, query: str, embedding: List[float]) -> List[Document]:
+        where = self.search_kwargs.get("filter")
+        vector_docs = self._vector_candidates(embedding, where)
+        lexical_docs = [doc for doc, _ in self.bm25.search(query, self.fetch_k, where)]
+        fused = reciprocal_rank_fusion(
+            [vector_docs, lexical_docs], rrf_k=self.rrf_k, weights=[self.vector_weight, self.bm25_weight]
+        )
+        return [doc for doc, _ in fused[:self.k]]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self._search(query, self.vector_store.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = await self.vector_store.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self._search, query, embedding)
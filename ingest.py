@@ -0,0 +1,334 @@
+"""
+Build or refresh the Chroma collection used by Retriever.
+
+Streams documents from --source (.txt, .md, .pdf, and .jsonl with one
+{"text": ..., "metadata": {...}} object per line), chunks them, embeds the
+chunks with concurrent, rate-limited Voyage batch requests and upserts them
+into Chroma in large batches.
+
+Runs are incremental: a manifest of chunk content hashes -> Chroma ids is
+kept per collection, so only new or changed chunks are embedded and an
+interrupted run resumes where it stopped. Nothing is deleted unless --prune
+is given, and then only chunks of the files this run read. --swap builds
+into a new versioned collection from --source alone and switches the active
+collection pointer (see active_collection.py) only once it is done.
+
+    python ingest.py --source data/
+    python ingest.py --source data/menus/ --prune
+    python ingest.py --source data/ --swap --drop-previous
+"""
+try:
+    import pysqlite3 as sqlite3
+except ImportError:
+    import sqlite3
+import sys
+sys.modules['sqlite3'] = sqlite3
+sys.modules['pysqlite3'] = sqlite3
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Iterator, List
+
+import chromadb
+import dotenv
+import voyageai
+from aiolimiter import AsyncLimiter
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from active_collection import DEFAULT_COLLECTION, read_active_collection, write_active_collection
+from metadata_filters import infer_flags
+
+EMBEDDING_MODEL = "voyage-large-2-instruct"
+SOURCE_SUFFIXES = (".txt", ".md", ".pdf", ".jsonl")
+BUILD_FILE = "ingest_building.json"
+
+dotenv.load_dotenv()
+
+
+def voyage_api_key() -> str:
+    if os.environ.get("VOYAGE_API_KEY"):
+        return os.environ["VOYAGE_API_KEY"]
+    import streamlit as st
+    return st.secrets["voyageai"]["api_key"]
+
+
+def iter_source_files(source: str) -> Iterator[str]:
+    if os.path.isfile(source):
+        yield source
+        return
+    for root, _, files in os.walk(source):
+        for name in sorted(files):
+            if name.endswith(SOURCE_SUFFIXES):
+                yield os.path.join(root, name)
+
+
+def load_documents(path: str) -> Iterator[Document]:
+    """
+    Lazily read one source file into Documents
+    """
+    if path.endswith(".jsonl"):
+        with open(path, "r") as f:
+            for line_number, line in enumerate(f):
+                if line.strip():
+                    record = json.loads(line)
+                    metadata = dict(record.get("metadata", {}), source=path, line=line_number)
+                    yield Document(page_content=record["text"], metadata=metadata)
+    elif path.endswith(".pdf"):
+        for page_number, page in enumerate(PdfReader(path).pages):
+            yield Document(page_content=page.extract_text(), metadata={"source": path, "page": page_number})
+    else:
+        with open(path, "r") as f:
+            yield Document(page_content=f.read(), metadata={"source": path})
+
+
+def content_hash(chunk: Document) -> str:
+    """
+    Chunk identity for incremental ingestion, also used as its Chroma id: an
+    unchanged chunk keeps its id no matter where it moves within the source
+    """
+    key = f"{chunk.metadata['source']}\x00{chunk.page_content}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def chunk_documents(docs: Iterator[Document], splitter: RecursiveCharacterTextSplitter) -> List[Document]:
+    chunks = []
+    for doc in docs:
+        for index, chunk in enumerate(splitter.split_documents([doc])):
+            chunk.metadata["chunk_index"] = index
+            # diet and allergen flags for profile-filtered retrieval
+            chunk.metadata.update(infer_flags(chunk.page_content, chunk.metadata))
+            chunks.append(chunk)
+    return chunks
+
+
+class Manifest:
+    """
+    Content hash -> Chroma id and metadata of every chunk in one collection,
+    kept in a JSON file next to the Chroma store. Saved after every flush,
+    so it doubles as the resume checkpoint: chunks already listed are not
+    embedded again.
+    """
+
+    def __init__(self, persist_directory: str, collection: str):
+        self.path = os.path.join(persist_directory, "manifests", f"{collection}.json")
+        self.chunks = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self.chunks = json.load(f)["chunks"]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"chunks": self.chunks}, f)
+        os.replace(tmp_path, self.path)
+
+
+class Embedder:
+    """
+    Concurrent, rate-limited Voyage document embedding in fixed-size batches
+    """
+
+    def __init__(self, api_key: str, model: str, batch_size: int, concurrency: int, requests_per_minute: int):
+        self.client = voyageai.AsyncClient(api_key=api_key)
+        self.model = model
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = AsyncLimiter(requests_per_minute, 60)
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        async with self.semaphore:
+            for attempt in range(5):
+                async with self.limiter:
+                    try:
+                        result = await self.client.embed(texts, model=self.model, input_type="document")
+                        return result.embeddings
+                    except Exception as e:
+                        if attempt == 4:
+                            raise
+                        print(f"Embedding batch failed ({e}), retrying")
+                await asyncio.sleep(2 ** attempt)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        return [vector for batch in results for vector in batch]
+
+
+def _batches(items: list, size: int) -> Iterator[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _build_target(persist_directory: str, base: str) -> str:
+    """
+    Name of the versioned collection a --swap run builds into; an interrupted
+    build is resumed rather than started over
+    """
+    path = os.path.join(persist_directory, BUILD_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)["collection"]
+    name = f"{base}_v{time.strftime('%Y%m%d%H%M%S')}"
+    with open(path, "w") as f:
+        json.dump({"collection": name}, f)
+    return name
+
+
+async def ingest(args) -> dict:
+    """
+    Bring the target collection in line with --source. Chunks whose content
+    hash is already in the manifest are kept (only their metadata is updated
+    if it moved) and new ones are embedded. With --prune, chunks of the files
+    read in this run that those files no longer produce are deleted once the
+    whole source tree has been read; chunks of other sources are never
+    touched, so ingesting a single new file leaves the rest in place.
+
+    With --swap the result goes into a new versioned collection: unchanged
+    chunks are copied from the live collection with their stored embeddings,
+    and the active collection pointer is switched only when the build is
+    complete.
+    """
+    client = chromadb.PersistentClient(path=args.persist_directory)
+    live_name = read_active_collection(args.persist_directory, args.collection)
+    target_name = _build_target(args.persist_directory, args.collection) if args.swap else live_name
+    live = client.get_or_create_collection(live_name)
+    target = client.get_or_create_collection(target_name) if args.swap else live
+    live_manifest = Manifest(args.persist_directory, live_name)
+    manifest = Manifest(args.persist_directory, target_name) if args.swap else live_manifest
+
+    upsert_batch = min(args.upsert_batch, client.get_max_batch_size())
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, add_start_index=True
+    )
+    embedder = Embedder(voyage_api_key(), args.model, args.embed_batch, args.concurrency, args.requests_per_minute)
+
+    stats = {"docs": 0, "chunks": 0, "embedded": 0, "copied": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    start = time.perf_counter()
+    seen = set()
+    scanned = set()
+    new, copies, updates = [], [], []
+
+    async def flush():
+        for batch in _batches(updates, upsert_batch):
+            target.update(ids=[h for h, _ in batch], metadatas=[c.metadata for _, c in batch])
+        for batch in _batches(copies, upsert_batch):
+            stored = live.get(ids=[h for h, _ in batch], include=["embeddings"])
+            vectors = dict(zip(stored["ids"], stored["embeddings"]))
+            # listed in the live manifest but missing from the collection
+            new.extend((h, c) for h, c in batch if h not in vectors)
+            batch = [(h, c) for h, c in batch if h in vectors]
+            stats["copied"] += len(batch)
+            if not batch:
+                continue
+            target.upsert(
+                ids=[h for h, _ in batch],
+                embeddings=[vectors[h] for h, _ in batch],
+                documents=[c.page_content for _, c in batch],
+                metadatas=[c.metadata for _, c in batch],
+            )
+        if new:
+            vectors = await embedder.embed([c.page_content for _, c in new])
+            for i in range(0, len(new), upsert_batch):
+                batch = new[i:i + upsert_batch]
+                target.upsert(
+                    ids=[h for h, _ in batch],
+                    embeddings=vectors[i:i + upsert_batch],
+                    documents=[c.page_content for _, c in batch],
+                    metadatas=[c.metadata for _, c in batch],
+                )
+        for h, chunk in updates + copies + new:
+            manifest.chunks[h] = {"id": h, "metadata": chunk.metadata}
+        manifest.save()
+        stats["updated"] += len(updates)
+        stats["embedded"] += len(new)
+        elapsed = time.perf_counter() - start
+        print(f"{stats['docs']} docs, {stats['chunks']} chunks ({stats['embedded']} embedded) "
+              f"| {stats['docs'] / elapsed:.1f} docs/s, {stats['chunks'] / elapsed:.1f} chunks/s")
+        new.clear()
+        copies.clear()
+        updates.clear()
+
+    for path in iter_source_files(args.source):
+        scanned.add(path)
+        docs = list(load_documents(path))
+        stats["docs"] += len(docs)
+        for chunk in chunk_documents(iter(docs), splitter):
+            h = content_hash(chunk)
+            if h in seen:
+                continue
+            seen.add(h)
+            stats["chunks"] += 1
+            if h in manifest.chunks:
+                if manifest.chunks[h]["metadata"] != chunk.metadata:
+                    updates.append((h, chunk))
+                else:
+                    stats["unchanged"] += 1
+            elif args.swap and h in live_manifest.chunks:
+                copies.append((h, chunk))
+            else:
+                new.append((h, chunk))
+        if len(new) + len(copies) + len(updates) >= upsert_batch:
+            await flush()
+    await flush()
+
+    if args.prune and scanned:
+        # chunks of the files read in this run that they no longer produce,
+        # including ones written before the manifest existed
+        stored = target.get(where={"source": {"$in": sorted(scanned)}}, include=[])
+        stale = [i for i in stored["ids"] if i not in seen]
+        for batch in _batches(stale, upsert_batch):
+            target.delete(ids=batch)
+        for h in stale:
+            manifest.chunks.pop(h, None)
+        manifest.save()
+        stats["deleted"] = len(stale)
+
+    if args.swap:
+        write_active_collection(target_name, args.persist_directory)
+        os.remove(os.path.join(args.persist_directory, BUILD_FILE))
+        print(f"Active collection switched {live_name} -> {target_name}")
+        if args.drop_previous and live_name != target_name:
+            client.delete_collection(live_name)
+            if os.path.exists(live_manifest.path):
+                os.remove(live_manifest.path)
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="file or directory of source documents")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION,
+                        help="used until an --swap run has written the active collection pointer")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--embed-batch", type=int, default=128, help="texts per Voyage request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Voyage requests in flight")
+    parser.add_argument("--requests-per-minute", type=int, default=300)
+    parser.add_argument("--upsert-batch", type=int, default=2000, help="chunks per Chroma upsert")
+    parser.add_argument("--prune", action="store_true",
+                        help="delete chunks the files read in this run no longer produce; chunks of files "
+                             "removed from --source are only dropped by a --swap rebuild")
+    parser.add_argument("--swap", action="store_true",
+                        help="build a new versioned collection and switch the active pointer when done")
+    parser.add_argument("--drop-previous", action="store_true",
+                        help="with --swap, delete the previously active collection after switching")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    stats = asyncio.run(ingest(args))
+    print(f"Done: {stats['docs']} docs / {stats['chunks']} chunks in {stats['seconds']:.1f}s "
+          f"({stats['docs'] / max(stats['seconds'], 1e-9):.1f} docs/s) | embedded {stats['embedded']}, "
+          f"copied {stats['copied']}, metadata updated {stats['updated']}, unchanged {stats['unchanged']}, "
+          f"deleted {stats['deleted']}")
@@ -0,0 +1,181 @@
+"""
+Local logging sinks for interaction/feedback events, and a Parquet rollup job.
+
+    python log_sinks.py rollup --source logs/events.db --out logs/parquet
+"""
+import abc
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterator, List, Tuple
+
+# per-source high-water marks, kept next to the dataset; pyarrow skips "_" files
+ROLLUP_STATE_FILE = "_rollup_state.json"
+
+
+class LogSink(abc.ABC):
+    """Destination for interaction and feedback events (one dict per event)."""
+
+    @abc.abstractmethod
+    def write(self, record: dict):
+        pass
+
+    def close(self):
+        pass
+
+
+class JSONLSink(LogSink):
+    """Append-only JSON Lines file, one event per line."""
+
+    def __init__(self, path: str = "logs/events.jsonl"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1)
+
+    def write(self, record: dict):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class SQLiteSink(LogSink):
+    """SQLite table in WAL mode; writers never block readers such as the rollup job."""
+
+    def __init__(self, path: str = "logs/events.db"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, email TEXT, "
+            "event TEXT NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def write(self, record: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO events (timestamp, email, event, payload) VALUES (?, ?, ?, ?)",
+                (record["timestamp"], record.get("email"), record["event"], json.dumps(record, default=str)),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def read_events(source: str) -> Iterator[dict]:
+    """Read events back from a JSONL file or an SQLiteSink database."""
+    if source.endswith(".jsonl"):
+        with open(source, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        conn = sqlite3.connect(source, timeout=30)
+        try:
+            for (payload,) in conn.execute("SELECT payload FROM events ORDER BY id"):
+                yield json.loads(payload)
+        finally:
+            conn.close()
+
+
+def read_new_events(source: str, after: int = 0) -> Tuple[List[dict], int]:
+    """
+    Events appended to source since the high-water mark `after`, and the new
+    mark: the last row id for an SQLiteSink database, the byte offset of the
+    last complete line for a JSONL file.
+    """
+    records = []
+    if source.endswith(".jsonl"):
+        with open(source, "rb") as f:
+            if os.fstat(f.fileno()).st_size < after:
+                after = 0  # truncated or replaced, start over
+            f.seek(after)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being written, picked up next run
+                after += len(line)
+                if line.strip():
+                    records.append(json.loads(line))
+    else:
+        conn = sqlite3.connect(source, timeout=30)
+        try:
+            for row_id, payload in conn.execute("SELECT id, payload FROM events WHERE id > ? ORDER BY id", (after,)):
+                records.append(json.loads(payload))
+                after = row_id
+        finally:
+            conn.close()
+    return records, after
+
+
+def rollup_to_parquet(source: str, out_dir: str) -> int:
+    """
+    Append the events written to source since the last rollup to a Parquet
+    dataset partitioned by event and date. The high-water mark per source is
+    kept in out_dir/_rollup_state.json and only advanced after the write;
+    files are named after the mark they start from, so a re-run after a
+    failed one overwrites its output instead of duplicating it.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    state_path = os.path.join(out_dir, ROLLUP_STATE_FILE)
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    source_key = os.path.abspath(source)
+    start = state.get(source_key, 0)
+    records, mark = read_new_events(source, start)
+
+    rows = []
+    for record in records:
+        row = {k: (v if isinstance(v, str) or v is None else json.dumps(v, default=str)) for k, v in record.items()}
+        row["date"] = str(record["timestamp"])[:10]
+        rows.append(row)
+    if rows:
+        columns = sorted({k for row in rows for k in row})
+        table = pa.table({c: [row.get(c) for row in rows] for c in columns})
+        source_name = os.path.splitext(os.path.basename(source))[0]
+        pq.write_to_dataset(
+            table,
+            root_path=out_dir,
+            partition_cols=["event", "date"],
+            basename_template=f"{source_name}-{start}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+
+    if mark != start:
+        os.makedirs(out_dir, exist_ok=True)
+        state[source_key] = mark
+        tmp_path = f"{state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rollup = subparsers.add_parser("rollup", help="roll events logged since the last run up into Parquet")
+    rollup.add_argument("--source", default="logs/events.db", help="SQLiteSink database or JSONL file")
+    rollup.add_argument("--out", default="logs/parquet")
+    args = parser.parse_args()
+
+    if args.command == "rollup":
+        count = rollup_to_parquet(args.source, args.out)
+        print(f"Wrote {count} new events to {args.out}")
@@ -0,0 +1,245 @@
+"""
+Diet and allergen flags on chunk metadata, and the Chroma `where` filters
+built from a user profile to match them.
+
+ingest.py writes the flags on every chunk. For food chunks (menus,
+nutrition facts) contains_<allergen> and contains_meat are True when such a
+term appears other
+than in "<term>-free", "no <term>", "without <term>" or "free of <term>", or
+in a plant-based stand-in like "peanut butter" or "oat milk". A diet flag
+is True when the chunk carries the diet's label or contains nothing the
+diet excludes (kosher and halal can only come from a label); a menu mixing
+chicken and tofu is still not vegetarian as a whole, which is why diet
+filters are opt-in (see Retriever) while allergen exclusions are not. Chunks
+that are not about food are compatible with every diet and contain no
+allergens, so course and campus content is never filtered out. Flags
+already present in the source metadata win over the inferred ones.
+"""
+import json
+import re
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+# marks chunks carrying the flags below; filters are only applied to
+# collections ingested with them
+FLAGS_KEY = "diet_flags"
+FLAGS_VERSION = 2
+
+# dashboard "Dietary Restrictions" option -> metadata flag
+DIET_FLAGS = {
+    "Vegetarian": "vegetarian",
+    "Vegan": "vegan",
+    "Gluten-Free": "gluten_free",
+    "Dairy-Free": "dairy_free",
+    "Kosher": "kosher",
+    "Halal": "halal",
+}
+
+# labels that mark a food chunk as suitable for each diet
+DIET_LABELS = {
+    "vegetarian": ("vegetarian", "vegan"),
+    "vegan": ("vegan",),
+    "gluten_free": ("gluten free", "gluten-free"),
+    "dairy_free": ("dairy free", "dairy-free", "vegan"),
+    "kosher": ("kosher",),
+    "halal": ("halal",),
+}
+
+ALLERGENS = {
+    "peanuts": ("peanut",),
+    "tree_nuts": ("tree nut", "almond", "cashew", "walnut", "pecan", "pistachio", "hazelnut", "macadamia"),
+    "shellfish": ("shellfish", "shrimp", "crab", "lobster", "clam", "scallop", "oyster", "mussel"),
+    "fish": ("fish", "salmon", "tuna", "cod", "tilapia", "pollock"),
+    "milk": ("milk", "dairy", "cheese", "butter", "cream", "yogurt", "whey"),
+    "eggs": ("egg",),
+    "wheat": ("wheat", "flour", "gluten"),
+    "soy": ("soy", "soybean", "tofu", "edamame"),
+    "sesame": ("sesame", "tahini"),
+}
+
+MEAT = ("meat", "chicken", "beef", "pork", "bacon", "ham", "hamburger", "turkey", "lamb", "sausage", "pepperoni",
+        "steak", "meatball", "veal", "duck", "salami", "chorizo", "prosciutto", "brisket", "hot dog")
+# besides meat and the fish, shellfish, milk and egg allergens
+NON_VEGAN = ("honey", "gelatin")
+GLUTEN_GRAINS = ("barley", "rye", "malt", "seitan")
+
+# what each diet excludes: keys of ALLERGENS, or "meat"
+DIET_EXCLUDES = {
+    "vegetarian": ("meat", "fish", "shellfish"),
+    "vegan": ("meat", "fish", "shellfish", "milk", "eggs"),
+    "gluten_free": ("wheat",),
+    "dairy_free": ("milk",),
+}
+
+# extra words users type in the allergies field
+ALLERGY_ALIASES = {
+    "nut": ("peanuts", "tree_nuts"),
+    "lactose": ("milk",),
+    "seafood": ("fish", "shellfish"),
+}
+
+# "<qualifier> butter" etc. is not dairy; "peanut butter" still matches peanuts
+DAIRY_STANDINS = re.compile(
+    r"\b(?:vegan|plant[- ]based|non[- ]dairy|peanut|almond|cashew|nut|seed|sunflower|soy|oat|rice|coconut|cocoa|"
+    r"apple)\s+(?:butter|milk|cream|cheese|yogurt)s?\b",
+    re.IGNORECASE,
+)
+
+# "veggie burger", "plant-based chicken" are not meat
+MEAT_STANDINS = re.compile(
+    r"\b(?:vegan|vegetarian|veggie|plant[- ]based|meatless|impossible|beyond|tofu|soy)\s+"
+    r"(?:chicken|beef|sausage|burger|meatball|bacon|pork|hot dog)s?\b",
+    re.IGNORECASE,
+)
+
+FOOD_TERMS = ("calorie", "kcal", "protein", "carbohydrate", "ingredient", "serving size", "allergen",
+              "menu", "entree", "entrée", "dining hall", "nutrition")
+
+
+def _pattern(terms: Iterable[str]) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")(?:e?s)?\b", re.IGNORECASE)
+
+
+DIET_PATTERNS = {flag: _pattern(labels) for flag, labels in DIET_LABELS.items()}
+ALLERGEN_PATTERNS = {allergen: _pattern(terms) for allergen, terms in ALLERGENS.items()}
+FOOD_PATTERN = _pattern(FOOD_TERMS)
+MEAT_PATTERN = _pattern(MEAT)
+NON_VEGAN_PATTERN = _pattern(NON_VEGAN)
+GLUTEN_GRAIN_PATTERN = _pattern(GLUTEN_GRAINS)
+
+_FLAG_TERMS = [t for terms in ALLERGENS.values() for t in terms] + list(MEAT) + ["nut"]
+_ALLERGEN_TERM = r"(?:" + "|".join(re.escape(t) for t in _FLAG_TERMS) + r")(?:e?s)?"
+_ALLERGEN_LIST = _ALLERGEN_TERM + r"(?:(?:\s*,\s*|\s*,?\s+(?:and|or)\s+)" + _ALLERGEN_TERM + r")*"
+# allergen and meat terms that say the food is without them
+NEGATED_ALLERGENS = re.compile(
+    r"\b(?:no|without|free\s+of)\s+" + _ALLERGEN_LIST + r"\b|\b" + _ALLERGEN_TERM + r"[\s-]free\b",
+    re.IGNORECASE,
+)
+
+
+def _allergen_text(text: str, allergen: str) -> str:
+    """
+    text with the spans that don't mean the chunk contains allergen (or
+    "meat") blanked out
+    """
+    text = NEGATED_ALLERGENS.sub(" ", text)
+    if allergen == "milk":
+        text = DAIRY_STANDINS.sub(" ", text)
+    elif allergen == "meat":
+        text = MEAT_STANDINS.sub(" ", text)
+    return text
+
+
+def infer_flags(text: str, metadata: Optional[dict] = None) -> dict:
+    """
+    Diet and allergen flags for one chunk, keeping any already in metadata
+    """
+    metadata = metadata or {}
+    food = bool(metadata.get("food", FOOD_PATTERN.search(text)))
+    flags = {FLAGS_KEY: FLAGS_VERSION, "food": food}
+    for allergen, pattern in ALLERGEN_PATTERNS.items():
+        flags[f"contains_{allergen}"] = food and bool(pattern.search(_allergen_text(text, allergen)))
+    flags["contains_meat"] = food and bool(MEAT_PATTERN.search(_allergen_text(text, "meat")))
+    for flag, pattern in DIET_PATTERNS.items():
+        if not food or pattern.search(text):
+            flags[flag] = True
+        elif flag in DIET_EXCLUDES:
+            flags[flag] = not any(flags[f"contains_{excluded}"] for excluded in DIET_EXCLUDES[flag])
+        else:
+            flags[flag] = False
+    if food and not DIET_PATTERNS["vegan"].search(text) and NON_VEGAN_PATTERN.search(_allergen_text(text, "")):
+        flags["vegan"] = False
+    if food and not DIET_PATTERNS["gluten_free"].search(text) and GLUTEN_GRAIN_PATTERN.search(text):
+        flags["gluten_free"] = False
+    flags.update({key: metadata[key] for key in flags if key in metadata})
+    return flags
+
+
+def parse_allergies(allergies: str) -> list:
+    found, spans = [], []
+    for allergen, pattern in ALLERGEN_PATTERNS.items():
+        for match in pattern.finditer(allergies):
+            found.append(allergen)
+            spans.append(match.span())
+    # a generic word only counts where no specific allergen matched, so
+    # "tree nuts" does not also pull in peanuts through "nut"
+    for alias, allergens in ALLERGY_ALIASES.items():
+        for match in _pattern([alias]).finditer(allergies):
+            start, end = match.span()
+            if not any(start < s_end and s_start < end for s_start, s_end in spans):
+                found.extend(allergens)
+    return sorted(set(found))
+
+
+def profile_filter(dietary_restrictions: Sequence[str], allergies: str, diet: bool = True) -> Optional[dict]:
+    """
+    Chroma `where` filter for a profile, None when nothing restricts results.
+    With diet False only the allergen exclusions are applied.
+    """
+    conditions = [{DIET_FLAGS[r]: True} for r in dietary_restrictions if r in DIET_FLAGS] if diet else []
+    conditions += [{f"contains_{allergen}": False} for allergen in parse_allergies(allergies or "")]
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def filter_key(where: dict) -> str:
+    return json.dumps(where, sort_keys=True)
+
+
+def matches_filter(metadata: dict, where: dict) -> bool:
+    """
+    Evaluate a Chroma `where` filter against one metadata dict, for the
+    in-process indexes (BM25, mmap). Missing keys never match, as in Chroma.
+    """
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, c) for c in condition):
+                return False
+        elif key not in metadata:
+            return False
+        elif isinstance(condition, dict):
+            value = metadata[key]
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif metadata[key] != condition:
+            return False
+    return True
+
+
+def matching_rows(metadatas: Sequence[dict], where: dict) -> np.ndarray:
+    return np.fromiter((i for i, m in enumerate(metadatas) if matches_filter(m, where)), dtype=np.int64)
+
+
+class FilterRowCache:
+    """
+    Row ids matching each filter seen so far. Profiles repeat, so every
+    distinct filter is evaluated over the corpus once and later queries
+    only search their pre-computed partition.
+    """
+
+    def __init__(self, metadatas: Sequence[dict], max_entries: int = 256):
+        self.metadatas = metadatas
+        self.max_entries = max_entries
+        self._rows: Dict[str, np.ndarray] = {}
+
+    def rows(self, where: dict) -> np.ndarray:
+        key = filter_key(where)
+        rows = self._rows.get(key)
+        if rows is None:
+            rows = matching_rows(self.metadatas, where)
+            if len(self._rows) >= self.max_entries:
+                self._rows.pop(next(iter(self._rows)))
+            self._rows[key] = rows
+        return rows
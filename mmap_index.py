@@ -0,0 +1,275 @@
+"""
+Read-only, memory-mapped serving copy of a Chroma collection: the vectors
+go to one normalised float32 .npy matrix that every worker process maps
+instead of loading, the texts and metadata to a JSON file. Searches are
+brute-force dot products (simsimd when installed, numpy otherwise).
+
+The export also holds int8 (per-dimension scale) and binary (sign bit)
+copies of the matrix. With quantization set, the scan runs over the 4x or
+32x smaller copy and only the best k * rescore candidates are re-scored
+against the float rows, so the float matrix stays on disk apart from the
+pages of those rows.
+
+    python mmap_index.py export
+    python mmap_index.py export --collection umich_fa2024 --out ./chroma_db/mmap/umich_fa2024
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from active_collection import read_active_collection
+from metadata_filters import FilterRowCache
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+VECTORS_FILE = "vectors.npy"
+INT8_FILE = "vectors_int8.npy"
+INT8_SCALE_FILE = "int8_scale.npy"
+BINARY_FILE = "vectors_binary.npy"
+DOCUMENTS_FILE = "documents.json"
+# written last, so an export without it is incomplete
+INDEX_FILE = "index.json"
+QUANTIZATIONS = ("none", "int8", "binary")
+# rows per block when scanning quantized vectors, bounds the float32 temporaries
+SCAN_BLOCK = 8192
+# set bits per byte value, for Hamming distances over packed sign bits
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def default_index_path(collection: str, persist_directory: str = "./chroma_db") -> str:
+    return os.path.join(persist_directory, "mmap", collection)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def quantize_int8(matrix: np.ndarray):
+    """
+    Symmetric int8 codes with one scale per dimension; x ~= codes * scale
+    """
+    scale = np.abs(matrix).max(axis=0) / 127 if len(matrix) else np.ones(matrix.shape[1], np.float32)
+    scale = np.where(scale == 0, 1, scale).astype(np.float32)
+    return np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8), scale
+
+
+def quantize_binary(matrix: np.ndarray) -> np.ndarray:
+    return np.packbits(matrix > 0, axis=-1)
+
+
+def _replace_with(path: str, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def export_collection(collection, out_dir: str, page_size: int = 5000) -> dict:
+    """
+    Dump every vector, text and metadata of a Chroma collection to out_dir
+    """
+    ids, documents, metadatas, vectors = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(m or {} for m in page["metadatas"])
+        vectors.extend(page["embeddings"])
+        if len(page["ids"]) < page_size:
+            break
+        offset += page_size
+
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32)) if vectors else np.zeros((0, 0), np.float32)
+    os.makedirs(out_dir, exist_ok=True)
+    _replace_with(os.path.join(out_dir, VECTORS_FILE), lambda f: np.save(f, matrix))
+    codes, scale = quantize_int8(matrix)
+    _replace_with(os.path.join(out_dir, INT8_FILE), lambda f: np.save(f, codes))
+    _replace_with(os.path.join(out_dir, INT8_SCALE_FILE), lambda f: np.save(f, scale))
+    _replace_with(os.path.join(out_dir, BINARY_FILE), lambda f: np.save(f, quantize_binary(matrix)))
+    records = [{"id": i, "text": t, "metadata": m} for i, t, m in zip(ids, documents, metadatas)]
+    _replace_with(os.path.join(out_dir, DOCUMENTS_FILE), lambda f: f.write(json.dumps(records).encode()))
+    info = {"collection": collection.name, "count": int(matrix.shape[0]), "dim": int(matrix.shape[1]) if vectors else 0}
+    _replace_with(os.path.join(out_dir, INDEX_FILE), lambda f: f.write(json.dumps(info).encode()))
+    return info
+
+
+class MmapVectorIndex:
+    """
+    Top-k search over the memory-mapped matrix: exact for quantization
+    "none", otherwise a scan over the quantized copy followed by float
+    re-scoring of the k * rescore best candidates
+    """
+
+    def __init__(self, path: str, quantization: str = "none", rescore: int = 4):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}, got {quantization!r}")
+        with open(os.path.join(path, INDEX_FILE), "r") as f:
+            self.info = json.load(f)
+        self.path = path
+        self.quantization = quantization
+        self.rescore = rescore
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        if quantization == "int8":
+            self.codes = np.load(os.path.join(path, INT8_FILE), mmap_mode="r")
+            self.scale = np.load(os.path.join(path, INT8_SCALE_FILE))
+        elif quantization == "binary":
+            self.codes = np.load(os.path.join(path, BINARY_FILE), mmap_mode="r")
+        with open(os.path.join(path, DOCUMENTS_FILE), "r") as f:
+            records = json.load(f)
+        self.ids = [r["id"] for r in records]
+        self.documents = [Document(page_content=r["text"], metadata=r["metadata"]) for r in records]
+        self.filter_rows = FilterRowCache([doc.metadata for doc in self.documents])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def scan_bytes(self) -> int:
+        """
+        Size of the matrix every query scans in full, i.e. what stays resident
+        """
+        return self.vectors.nbytes if self.quantization == "none" else self.codes.nbytes
+
+    def similarities(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        if simsimd is not None:
+            return 1 - np.asarray(simsimd.cdist(query[None, :], vectors, metric="cosine"))[0]
+        return vectors @ query
+
+    def approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Scores from the quantized copy, higher is closer
+        """
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        if self.quantization == "int8":
+            scaled_query = (query * self.scale).astype(np.float32)
+            for start in range(0, len(codes), SCAN_BLOCK):
+                scores[start:start + SCAN_BLOCK] = codes[start:start + SCAN_BLOCK].astype(np.float32) @ scaled_query
+        else:
+            query_bits = quantize_binary(query)
+            for start in range(0, len(codes), SCAN_BLOCK):
+                # summed as int32: the default uint64 sum would wrap when negated
+                distances = POPCOUNT[np.bitwise_xor(codes[start:start + SCAN_BLOCK], query_bits)].sum(
+                    axis=1, dtype=np.int32)
+                scores[start:start + SCAN_BLOCK] = -distances
+        return scores
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, query: np.ndarray, k: int, where: Optional[dict] = None) -> List[Tuple[int, float]]:
+        """
+        Row indices and cosine similarities of the k nearest vectors, only
+        among rows matching a Chroma-style `where` filter when one is given
+        """
+        rows = self.filter_rows.rows(where) if where else None
+        if not len(self) or (rows is not None and not len(rows)):
+            return []
+        if self.quantization == "none":
+            scores = self.similarities(query, rows)
+            top = self._top(scores, k)
+            hits = [(i if rows is None else rows[i], scores[i]) for i in top]
+        else:
+            query = _normalize(np.asarray(query, dtype=np.float32))
+            candidates = np.sort(self._top(self.approximate_scores(query, rows), k * self.rescore))
+            if rows is not None:
+                candidates = rows[candidates]
+            exact = np.asarray(self.vectors[candidates]) @ query
+            hits = [(candidates[i], exact[i]) for i in self._top(exact, k)]
+        return [(int(i), float(score)) for i, score in hits]
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Read-only VectorStore over an MmapVectorIndex, so as_retriever() and
+    HybridRetriever work on it unchanged. Scores are squared L2 distances
+    like Chroma's default space, which keeps relevance scores (and so the
+    0.5 score_threshold) comparable between the two backends.
+    """
+
+    def __init__(self, index: MmapVectorIndex, embedding: Embeddings):
+        self.index = index
+        self.embedding = embedding
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def documents(self) -> List[Document]:
+        return self.index.documents
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("MmapVectorStore is read-only, re-export the Chroma collection instead")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any):
+        raise NotImplementedError("build the index with `python mmap_index.py export`")
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        # unit vectors: |a - b|^2 = 2 - 2 cos(a, b)
+        hits = self.index.search(np.asarray(embedding), k, where=filter)
+        return [(self.index.documents[i], 2 - 2 * score) for i, score in hits]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        # named and scored (distances, despite the name) like Chroma's, for HybridRetriever
+        return self.similarity_search_by_vector_with_score(embedding, k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _similarity_search_with_relevance_scores(self, query: str, k: int = 4, **kwargs: Any):
+        relevance = self._select_relevance_score_fn()
+        return [(doc, relevance(distance)) for doc, distance in self.similarity_search_with_score(query, k, **kwargs)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="export a Chroma collection to a memory-mapped index")
+    export.add_argument("--persist-directory", default="./chroma_db")
+    export.add_argument("--collection", default=None, help="defaults to the active collection")
+    export.add_argument("--out", default=None, help="defaults to <persist-directory>/mmap/<collection>")
+    args = parser.parse_args()
+
+    try:
+        import pysqlite3
+        sys.modules['sqlite3'] = pysqlite3
+    except ImportError:
+        pass
+    import chromadb
+
+    name = args.collection or read_active_collection(args.persist_directory)
+    client = chromadb.PersistentClient(path=args.persist_directory)
+    info = export_collection(client.get_collection(name), args.out or default_index_path(name, args.persist_directory))
+    print(f"Exported {info['count']} vectors of dim {info['dim']} from {info['collection']}")
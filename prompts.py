@@ -0,0 +1,89 @@
+"""
+Prompt registry: the prompt files are read, validated and token-counted once
+per process. Print the static token report with:
+
+    python prompts.py
+"""
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet
+
+from langchain_core.prompts import PromptTemplate
+
+from token_counter import count_tokens
+
+PROMPT_FILES = {
+    "retriever": "retriever_prompt.txt",
+    "audit_summary": "audit_summary_prompt.txt",
+    "tara": "tara_prompt.txt",
+}
+
+# every template must use exactly these variables
+PROMPT_VARIABLES = {
+    "retriever": frozenset({"user_specific_conditions", "dietary_preferences", "nutritional_goals"}),
+    "audit_summary": frozenset({"audit"}),
+    "tara": frozenset({"context"}),
+}
+
+PLACEHOLDER = re.compile(r"(?<!\{)\{(\w+)\}(?!\})")
+
+
+@dataclass(frozen=True)
+class PromptSpec:
+    name: str
+    path: str
+    text: str
+    input_variables: FrozenSet[str]
+    # text before the first placeholder, identical on every call and so
+    # eligible for provider prompt caching
+    static_prefix: str
+    dynamic_suffix: str
+    tokens: int
+    static_tokens: int
+
+
+def _load_prompt(name: str, path: str) -> PromptSpec:
+    with open(path, "r") as f:
+        text = f.read()
+
+    input_variables = frozenset(PromptTemplate.from_template(text).input_variables)
+    expected = PROMPT_VARIABLES[name]
+    if input_variables != expected:
+        raise ValueError(
+            f"{path}: expected variables {sorted(expected)}, found {sorted(input_variables)}"
+        )
+
+    first = PLACEHOLDER.search(text)
+    split = first.start() if first else len(text)
+    static_prefix, dynamic_suffix = text[:split], text[split:]
+    return PromptSpec(
+        name=name,
+        path=path,
+        text=text,
+        input_variables=input_variables,
+        static_prefix=static_prefix,
+        dynamic_suffix=dynamic_suffix,
+        tokens=count_tokens(PLACEHOLDER.sub("", text)),
+        static_tokens=count_tokens(static_prefix),
+    )
+
+
+@lru_cache(maxsize=None)
+def load_prompts(base_dir: str = ".") -> Dict[str, PromptSpec]:
+    return {name: _load_prompt(name, os.path.join(base_dir, path)) for name, path in PROMPT_FILES.items()}
+
+
+def get_prompt(name: str, base_dir: str = ".") -> PromptSpec:
+    return load_prompts(base_dir)[name]
+
+
+def report_token_counts(base_dir: str = "."):
+    for spec in load_prompts(base_dir).values():
+        print(f"{spec.name:<14} {spec.tokens:6d} tokens | static prefix {spec.static_tokens:6d} tokens | "
+              f"variables: {', '.join(sorted(spec.input_variables))}")
+
+
+if __name__ == "__main__":
+    report_token_counts()
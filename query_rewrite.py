@@ -0,0 +1,99 @@
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable, RunnableBranch, RunnableConfig, RunnableLambda
+
+# words that usually point back at earlier turns ("is it vegan?", "what about dinner?")
+FOLLOW_UP_WORDS = {
+    "it", "its", "that", "this", "those", "these", "they", "them", "their", "there",
+    "he", "she", "him", "her", "one", "ones", "more", "less", "else", "again", "also",
+    "instead", "same", "another", "above", "previous", "earlier", "former", "latter",
+}
+FOLLOW_UP_OPENERS = ("and ", "but ", "or ", "so ", "what about", "how about", "why not", "then ")
+MIN_SELF_CONTAINED_WORDS = 4
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="query-rewrite")
+
+
+def is_self_contained(query: str) -> bool:
+    """
+    Cheap check for queries that can be searched as-is without rewriting
+    against the chat history
+    """
+    text = query.strip().lower()
+    words = re.findall(r"[a-z']+", text)
+    if len(words) < MIN_SELF_CONTAINED_WORDS:
+        return False
+    if text.startswith(FOLLOW_UP_OPENERS):
+        return False
+    return not any(w in FOLLOW_UP_WORDS for w in words)
+
+
+def _skip_rewrite(x: dict) -> bool:
+    return not x.get("chat_history") or is_self_contained(x["input"])
+
+
+def _race(raw: Runnable, rewrite: Runnable, min_docs: int):
+    """
+    Run the raw-query retrieval and rewrite + retrieval concurrently and
+    return the first result with at least min_docs documents
+    """
+
+    def race(x: dict, config: RunnableConfig):
+        futures = {
+            _executor.submit(raw.invoke, x, config): "raw",
+            _executor.submit(rewrite.invoke, x, config): "rewrite",
+        }
+        results = {}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"{name} retrieval failed: {e}")
+                    continue
+                if len(results[name]) >= min_docs:
+                    print(f"Using {name} retrieval ({len(results[name])} docs)")
+                    return results[name]
+        # neither was usable, prefer the rewritten query
+        return results.get("rewrite", results.get("raw", []))
+
+    return RunnableLambda(race, name="race_retrieval")
+
+
+def build_history_aware_retriever(
+    llm: BaseLanguageModel,
+    retriever: BaseRetriever,
+    prompt: BasePromptTemplate,
+    mode: str = "auto",
+    race_min_docs: int = 3,
+) -> Runnable:
+    """
+    Drop-in for create_history_aware_retriever with a fast path around the
+    rewrite LLM call.
+
+    mode:
+        "always"  rewrite whenever there is chat history (langchain default)
+        "auto"    also skip the rewrite for self-contained queries
+        "race"    like "auto", and when a rewrite is needed run it concurrently
+                  with a raw-query retrieval, taking whichever is usable first
+    """
+    raw = (lambda x: x["input"]) | retriever
+    rewrite = prompt | llm | StrOutputParser() | retriever
+
+    if mode == "always":
+        skip = lambda x: not x.get("chat_history")
+    elif mode in ("auto", "race"):
+        skip = _skip_rewrite
+    else:
+        raise ValueError(f"Unknown query rewrite mode: {mode}")
+
+    slow_path = _race(raw, rewrite, race_min_docs) if mode == "race" else rewrite
+    return RunnableBranch((skip, raw), slow_path).with_config(run_name="chat_retriever_chain")
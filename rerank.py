@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from hybrid_retrieval import tokenize
+from token_counter import count_tokens
+
+
+class LexicalOverlapScorer:
+    """
+    Share of the query's terms and adjacent term pairs found in the passage.
+    No model, microseconds per passage.
+    """
+
+    name = "lexical"
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        query_terms = tokenize(query)
+        terms = set(query_terms)
+        bigrams = set(zip(query_terms, query_terms[1:]))
+        scores = []
+        for passage in passages:
+            passage_terms = tokenize(passage)
+            present = terms.intersection(passage_terms)
+            score = len(present) / (len(terms) or 1)
+            if bigrams:
+                score += 0.5 * len(bigrams.intersection(zip(passage_terms, passage_terms[1:]))) / len(bigrams)
+            scores.append(score)
+        return scores
+
+
+class CrossEncoderScorer:
+    """
+    Local cross-encoder run on CPU with transformers; the model is loaded on
+    first use
+    """
+
+    def __init__(self, model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size: int = 16, max_length: int = 512):
+        self.name = model
+        self.model_name = model
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._model = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from transformers import AutoModelForSequenceClassification, AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._model = AutoModelForSequenceClassification.from_pretrained(self.model_name).eval()
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        import torch
+
+        self._load()
+        scores = []
+        for i in range(0, len(passages), self.batch_size):
+            batch = list(passages[i:i + self.batch_size])
+            features = self._tokenizer(
+                [query] * len(batch), batch, padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="pt",
+            )
+            with torch.no_grad():
+                logits = self._model(**features).logits
+            scores.extend(logits[:, 0].tolist())
+        return scores
+
+
+def build_scorer(scorer: str = "lexical", model: Optional[str] = None):
+    if scorer == "cross_encoder":
+        return CrossEncoderScorer(model) if model else CrossEncoderScorer()
+    return LexicalOverlapScorer()
+
+
+class Reranker:
+    """
+    Reorders retrieved chunks by scorer relevance and keeps the best top_n
+    that fit in max_tokens (the first one is always kept). Orderings are
+    cached per query and candidate set.
+    """
+
+    def __init__(self, scorer=None, top_n: int = 4, max_tokens: int = 2000, cache_size: int = 1024):
+        self.scorer = scorer or LexicalOverlapScorer()
+        self.top_n = top_n
+        self.max_tokens = max_tokens
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "tokens_in": 0, "tokens_out": 0}
+
+    def _key(self, query: str, docs: Sequence[Document]) -> str:
+        digest = hashlib.sha256(f"{self.scorer.name}\x00{query}".encode())
+        for doc in docs:
+            digest.update(b"\x00" + doc.page_content.encode())
+        return digest.hexdigest()
+
+    def _order(self, query: str, docs: Sequence[Document]) -> List[int]:
+        key = self._key(query, docs)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._cache[key]
+            self.stats["misses"] += 1
+
+        scores = self.scorer.score(query, [doc.page_content for doc in docs])
+        order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        with self._lock:
+            self._cache[key] = order
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return order
+
+    def rerank(self, query: str, docs: Sequence[Document]) -> List[Document]:
+        if not docs:
+            return []
+        kept, tokens = [], 0
+        for i in self._order(query, docs)[:self.top_n]:
+            doc_tokens = count_tokens(docs[i].page_content)
+            if kept and tokens + doc_tokens > self.max_tokens:
+                break
+            kept.append(docs[i])
+            tokens += doc_tokens
+        with self._lock:
+            self.stats["tokens_in"] += sum(count_tokens(doc.page_content) for doc in docs)
+            self.stats["tokens_out"] += tokens
+        return kept
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Runs base_retriever for candidates and returns them reranked and pruned.
+    search_kwargs are merged into the base retriever's own.
+    """
+
+    base_retriever: BaseRetriever
+    reranker: Reranker
+    # per-request extras, set through the "search_kwargs" ConfigurableField
+    search_kwargs: dict = {}
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _base(self) -> BaseRetriever:
+        if not self.search_kwargs:
+            return self.base_retriever
+        base = self.base_retriever
+        return base.copy(update={"search_kwargs": {**base.search_kwargs, **self.search_kwargs}})
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self._base().invoke(query, config={"callbacks": run_manager.get_child()})
+        return self.reranker.rerank(query, docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = await self._base().ainvoke(query, config={"callbacks": run_manager.get_child()})
+        # a cross-encoder is CPU-bound, keep it off the event loop
+        return await asyncio.to_thread(self.reranker.rerank, query, docs)
@@ -0,0 +1,130 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# the answer to these depends on the day asked (menus, hours, plans)
+TIME_SENSITIVE = re.compile(
+    r"\b(todays?|tonight|tomorrow|yesterday|right now|this (morning|afternoon|evening|week|weekend)"
+    r"|next week|(mon|tues|wednes|thurs|fri|satur|sun)day)\b"
+)
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Lowercase, collapse whitespace and drop trailing punctuation so trivially
+    different spellings of a question share a cache entry
+    """
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+class ResponseCache:
+    """
+    Cache of streamed answers in front of the chat chain.
+
+    Lookups try an exact match on normalized prompt + profile fingerprint
+    first, then (with embeddings set) the most similar cached prompt for the
+    same profile above similarity_threshold. The semantic tier is opt-in: a
+    near-duplicate question ("calories in 100g rice" vs "in 200g") can need a
+    different answer, so keep the threshold high and check hits before
+    enabling it. Prompts that mention a day ("lunch today", "this week") are
+    never cached, and other answers expire after ttl_seconds. Answers are
+    stored as the original chunks so a hit can be replayed through
+    st.write_stream.
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 512,
+        ttl_seconds: float = 3 * 60 * 60,
+    ):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "time_sensitive": 0}
+
+    @staticmethod
+    def _key(prompt: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}\x00{prompt}".encode()).hexdigest()
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        # the raw prompt, i.e. the same text retrieval embeds for a first or
+        # self-contained turn, so CachedEmbeddings serves both from one call
+        vector = np.asarray(self.embeddings.embed_query(prompt), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _expire(self, now: float):
+        expired = [k for k, e in self._entries.items() if now - e["created"] > self.ttl_seconds]
+        for k in expired:
+            del self._entries[k]
+
+    @staticmethod
+    def cacheable(prompt: str) -> bool:
+        return TIME_SENSITIVE.search(normalize_prompt(prompt)) is None
+
+    def lookup(self, prompt: str, fingerprint: str) -> Optional[List[str]]:
+        if not self.cacheable(prompt):
+            with self._lock:
+                self.stats["time_sensitive"] += 1
+            return None
+        normalized = normalize_prompt(prompt)
+        key = self._key(normalized, fingerprint)
+        with self._lock:
+            self._expire(time.time())
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return self._entries[key]["chunks"]
+            candidates = [
+                (k, e) for k, e in self._entries.items()
+                if e["fingerprint"] == fingerprint and e["vector"] is not None
+            ]
+
+        if self.embeddings is not None and candidates:
+            vector = self._embed(prompt)
+            scores = np.stack([e["vector"] for _, e in candidates]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                best_key, entry = candidates[best]
+                with self._lock:
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                    self.stats["semantic_hits"] += 1
+                print(f"Semantic cache hit ({scores[best]:.3f}): {entry['prompt']!r}")
+                return entry["chunks"]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def store(self, prompt: str, fingerprint: str, chunks: List[str]):
+        if not chunks or not self.cacheable(prompt):
+            return
+        normalized = normalize_prompt(prompt)
+        vector = self._embed(prompt) if self.embeddings is not None else None
+        with self._lock:
+            self._entries[self._key(normalized, fingerprint)] = {
+                "prompt": normalized,
+                "fingerprint": fingerprint,
+                "vector": vector,
+                "chunks": list(chunks),
+                "created": time.time(),
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def replay(chunks: List[str]) -> Iterator[str]:
+        yield from chunks
@@ -4,33 +4,109 @@ from chromadb.config import DEFAULT_TENANT, DEFAULT_DATABASE, Settings
 import chromadb
 import dotenv
 import streamlit as st
+from langchain_core.runnables import ConfigurableField
+from embedding_cache import CachedEmbeddings
+from active_collection import read_active_collection
+from hybrid_retrieval import BM25Index, HybridRetriever
+from metadata_filters import FLAGS_KEY, FLAGS_VERSION
+from mmap_index import MmapVectorIndex, MmapVectorStore, default_index_path
+from rerank import Reranker, RerankingRetriever, build_scorer
 
 
 # load VoyageAI key
 dotenv.load_dotenv()
 
-class MyEmbeddings:
-        def __init__(self, model):
-            self.model = model
-        def embed_documents(self):
-            return 0
-        
-        def embed_query(self, query):
-            return list([0]*1024)
-        
-
 class Retriever:
     def __init__(self, model: str = "voyage-2") -> None:
         new_client = chromadb.PersistentClient(path = "./chroma_db", tenant = DEFAULT_TENANT, database = DEFAULT_DATABASE, settings = Settings())
 
-        embeddings = VoyageAIEmbeddings(
+        voyage_embeddings = VoyageAIEmbeddings(
             voyage_api_key=st.secrets["voyageai"]["api_key"], model="voyage-large-2-instruct")
-        
-        dummyEmbeddings = MyEmbeddings(model="dummy")
+        # [embedding_cache] section in secrets: max_entries, sqlite_path
+        embeddings = CachedEmbeddings(
+            voyage_embeddings, model="voyage-large-2-instruct", **dict(st.secrets.get("embedding_cache", {})))
+
+        self.embeddings = embeddings
 
-        saved_data_store = Chroma(persist_directory="./chroma_db", collection_name="umich_fa2024", embedding_function=embeddings, client=new_client)
-        saved_data_store_dummy = Chroma(persist_directory="./chroma_db", collection_name="umich_fa2024", embedding_function=dummyEmbeddings, client=new_client)
+        # switched atomically by `ingest.py --swap`, picked up when the bot is next built
+        self.collection_name = read_active_collection("./chroma_db")
+        # [retrieval] section in secrets: mode ("similarity" | "hybrid"), backend ("chroma" | "mmap"),
+        # mmap_path, quantization ("none" | "int8" | "binary"), rescore, diet_filters, k, fetch_k, score_threshold, rrf_k
+        retrieval_config = dict(st.secrets.get("retrieval", {}))
+        # allergen exclusions always apply; diet restrictions only filter when
+        # enabled, since a chunk mixing e.g. chicken and tofu fails the vegetarian flag
+        self.diet_filters = retrieval_config.pop("diet_filters", False)
+        # hybrid stays opt-in until benchmarks/bench_retrieval.py shows its hit rate
+        # at the configured k matching the similarity retriever's at k=10
+        self.mode = retrieval_config.pop("mode", "similarity")
+        self.backend = retrieval_config.pop("backend", "chroma")
+        mmap_path = retrieval_config.pop("mmap_path", default_index_path(self.collection_name))
+        quantization = retrieval_config.pop("quantization", "none")
+        rescore = retrieval_config.pop("rescore", 4)
+        if quantization != "none" and self.backend != "mmap":
+            raise ValueError("quantized retrieval needs backend = \"mmap\" in the [retrieval] section")
+
+        if self.backend == "mmap":
+            # read-only export made by `python mmap_index.py export`, mapped rather than loaded
+            index = MmapVectorIndex(mmap_path, quantization=quantization, rescore=rescore)
+            saved_data_store = MmapVectorStore(index, embeddings)
+        else:
+            saved_data_store = Chroma(persist_directory="./chroma_db", collection_name=self.collection_name, embedding_function=embeddings, client=new_client)
 
         self.retriver_sim = saved_data_store.as_retriever(search_type="similarity_score_threshold", search_kwargs={"k": 10, "score_threshold": 0.5})
-        self.retriever_dummy = saved_data_store_dummy.as_retriever(search_type="similarity_score_threshold", search_kwargs={"k": 1, "score_threshold": 0.99})
+
+        # [rerank] section in secrets: enabled, scorer ("lexical" | "cross_encoder"), model, candidates, top_n, max_tokens
+        rerank_config = dict(st.secrets.get("rerank", {}))
+        # off until benchmarks/eval_rerank.py shows the scorer keeps the fused
+        # order's recall: the lexical scorer replaces that order outright
+        rerank_enabled = rerank_config.pop("enabled", False)
+        if rerank_enabled:
+            # retrieve a wider candidate set for the reranker to prune
+            retrieval_config.setdefault("k", rerank_config.pop("candidates", 10))
+        if self.mode == "hybrid":
+            if self.backend == "mmap":
+                bm25 = BM25Index(saved_data_store.documents)
+            else:
+                bm25 = BM25Index.from_collection(saved_data_store._collection)
+            self.retriver_hybrid = HybridRetriever(vector_store=saved_data_store, bm25=bm25, **retrieval_config)
+            self.rag_retriever = self.retriver_hybrid
+        else:
+            self.rag_retriever = self.retriver_sim
+
+        self.reranker = None
+        if rerank_enabled:
+            scorer = build_scorer(rerank_config.pop("scorer", "lexical"), rerank_config.pop("model", None))
+            self.reranker = Reranker(scorer, **rerank_config)
+            self.rag_retriever = RerankingRetriever(base_retriever=self.rag_retriever, reranker=self.reranker)
+
+        # profile filters need the diet/allergen flags written by ingest.py
+        if self.backend == "mmap":
+            sample = [doc.metadata for doc in saved_data_store.documents[:1]]
+        else:
+            sample = saved_data_store._collection.get(limit=1, include=["metadatas"])["metadatas"]
+        # older flag versions lack keys the filters use, and missing keys never match
+        self.profile_filters = bool(sample) and (sample[0] or {}).get(FLAGS_KEY, 0) >= FLAGS_VERSION
+        if not self.profile_filters:
+            print("Collection has no current diet flags, profile filters disabled (re-run ingest.py)")
+
+        # search kwargs (the profile's `where` filter) are set per request through
+        # config={"configurable": {"search_kwargs": ...}}, see search_kwargs_for
+        self._base_search_kwargs = dict(self.rag_retriever.search_kwargs)
+        self.rag_retriever = self.rag_retriever.configurable_fields(
+            search_kwargs=ConfigurableField(
+                id="search_kwargs",
+                name="Search kwargs",
+                description="Per-request search kwargs, e.g. a metadata filter from the user profile",
+            )
+        )
+
+    def search_kwargs_for(self, profile=None) -> dict:
+        """
+        search_kwargs for one request: the retriever's own plus the profile's
+        metadata filter
+        """
+        where = profile.retrieval_filter(diet=self.diet_filters) if profile is not None and self.profile_filters else None
+        if not where:
+            return dict(self._base_search_kwargs)
+        return {**self._base_search_kwargs, "filter": where}
 
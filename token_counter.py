@@ -0,0 +1,44 @@
+from functools import lru_cache
+from typing import Sequence
+
+import tiktoken
+from langchain_core.messages import BaseMessage
+
+# gpt-4o-mini tokenizer
+ENCODING_NAME = "o200k_base"
+
+# fixed per-message overhead added by the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = ENCODING_NAME) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens in a plain string
+    """
+    if not text:
+        return 0
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def message_text(message: BaseMessage) -> str:
+    """
+    Flatten message content (str or list of content blocks) to plain text
+    """
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in message.content
+    )
+
+
+def count_message_tokens(messages: Sequence[BaseMessage]) -> int:
+    """
+    Count tokens for a list of chat messages, including per-message overhead
+    """
+    return sum(count_tokens(message_text(m)) + MESSAGE_OVERHEAD for m in messages)
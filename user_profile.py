@@ -0,0 +1,63 @@
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from metadata_filters import profile_filter
+
+EMPTY_PROMPT_VARIABLES = {
+    "user_profile": "",
+    "dietary_preferences": "",
+    "nutritional_goals": "",
+    "user_specific_conditions": "",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class UserProfile:
+    """
+    Profile from the sidebar form, built once on submit. Frozen so it can
+    key the cached prompt-variable rendering and the response cache.
+    """
+    age: int
+    gender: str
+    weight: float
+    height: int
+    dietary_restrictions: Tuple[str, ...]
+    allergies: str
+    health_conditions: str
+    primary_goal: str
+    activity_level: str
+
+    def prompt_variables(self) -> dict:
+        return dict(_render_prompt_variables(self))
+
+    def fingerprint(self) -> str:
+        return _fingerprint(self)
+
+    def retrieval_filter(self, diet: bool = True) -> Optional[dict]:
+        """
+        Chroma `where` filter from dietary restrictions (unless diet is False)
+        and allergies
+        """
+        return profile_filter(self.dietary_restrictions, self.allergies, diet=diet)
+
+
+@lru_cache(maxsize=1024)
+def _render_prompt_variables(profile: UserProfile) -> tuple:
+    conditions = ", ".join(filter(None, (profile.health_conditions.strip(), profile.allergies.strip())))
+    variables = {
+        "user_profile": (
+            f"{profile.age}y {profile.gender}, {profile.weight:g} lbs, {profile.height} in, "
+            f"{profile.activity_level.lower()}"
+        ),
+        "dietary_preferences": ", ".join(profile.dietary_restrictions),
+        "nutritional_goals": profile.primary_goal,
+        "user_specific_conditions": conditions,
+    }
+    return tuple(variables.items())
+
+
+@lru_cache(maxsize=1024)
+def _fingerprint(profile: UserProfile) -> str:
+    return hashlib.sha256(repr(profile).encode()).hexdigest()[:16]